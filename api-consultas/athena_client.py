@@ -6,10 +6,61 @@ import boto3
 import time
 import logging
 import os
-from typing import List, Dict, Any, Optional
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import List, Dict, Any, Callable, Optional, Sequence, Tuple
+from botocore.exceptions import ClientError
+
+from fingerprint import bind_parameters, query_fingerprint
+from result_registry import ResultRegistry
 
 logger = logging.getLogger(__name__)
 
+# Prefijo de los prepared statements registrados por la API en el workgroup
+PREPARED_STATEMENT_PREFIX = "api_"
+
+
+@dataclass
+class QueryStats:
+    """Estadísticas de una ejecución en Athena (tiempos en ms)"""
+    query_execution_id: str
+    execution_time_ms: int
+    queue_time_ms: int = 0
+    planning_time_ms: int = 0
+    engine_time_ms: int = 0
+    service_time_ms: int = 0
+    data_scanned_bytes: int = 0
+    reused_result: bool = False
+    fingerprint: str = ""
+    engine: str = "athena"
+
+    @classmethod
+    def from_execution(cls, query_execution: Dict[str, Any], execution_time_ms: int,
+                       fingerprint: str = "") -> "QueryStats":
+        """
+        Construye las estadísticas a partir de la respuesta de get_query_execution
+
+        Args:
+            query_execution: Campo 'QueryExecution' de get_query_execution
+            execution_time_ms: Tiempo total medido por el cliente (start + poll + fetch)
+            fingerprint: Fingerprint de la query ejecutada
+        """
+        statistics = query_execution.get('Statistics', {})
+        return cls(
+            query_execution_id=query_execution['QueryExecutionId'],
+            execution_time_ms=execution_time_ms,
+            fingerprint=fingerprint,
+            queue_time_ms=statistics.get('QueryQueueTimeInMillis', 0),
+            planning_time_ms=statistics.get('QueryPlanningTimeInMillis', 0),
+            engine_time_ms=statistics.get('EngineExecutionTimeInMillis', 0),
+            # Incluye pre y post procesamiento del servicio
+            service_time_ms=(statistics.get('ServicePreProcessingTimeInMillis', 0)
+                             + statistics.get('ServiceProcessingTimeInMillis', 0)),
+            data_scanned_bytes=statistics.get('DataScannedInBytes', 0),
+            reused_result=statistics.get('ResultReuseInformation', {}).get('ReusedPreviousResult', False)
+        )
+
 
 class AthenaClient:
     """Cliente para interactuar con Amazon Athena"""
@@ -24,10 +75,28 @@ class AthenaClient:
         region = region_name or os.getenv("AWS_DEFAULT_REGION", "us-east-1")
         self.athena = boto3.client('athena', region_name=region)
         self.s3 = boto3.client('s3', region_name=region)
+        self.glue = boto3.client('glue', region_name=region)
         self.database = os.getenv("ATHENA_DATABASE", "datalake_raw")
         self.output_location = os.getenv("ATHENA_OUTPUT_LOCATION", "s3://raw-ms1-data-bgc/athena-results/")
         self.workgroup = os.getenv("ATHENA_WORKGROUP", "primary")
-        self.last_execution_time_ms = 0
+        
+        # Prepared statements registrados en el workgroup (nombre -> ok/falló)
+        self.use_prepared_statements = os.getenv("ATHENA_PREPARED_STATEMENTS", "true").lower() == "true"
+        self._prepared_statements: Dict[str, bool] = {}
+        self._prepared_lock = threading.Lock()
+        
+        # Reutilización de resultados: Athena (ResultReuseConfiguration) + registro local persistente
+        self.result_reuse_max_age_minutes = int(os.getenv("ATHENA_RESULT_REUSE_MAX_AGE_MINUTES", "60"))
+        self.result_registry = None
+        if self.result_reuse_max_age_minutes > 0:
+            self.result_registry = ResultRegistry(
+                os.getenv("RESULT_REGISTRY_PATH", "data/result_registry.db"),
+                max_age_seconds=self.result_reuse_max_age_minutes * 60
+            )
+        # Health check con GetWorkGroup (False si el rol no tiene el permiso)
+        self._workgroup_check = True
+        # Devuelve el epoch de la última ingesta: no se reutilizan resultados anteriores
+        self.ingestion_watermark: Optional[Callable[[], float]] = None
         
         logger.info(f"AthenaClient inicializado - Database: {self.database}, Region: {region}")
     
@@ -42,46 +111,301 @@ class AthenaClient:
         Returns:
             Lista de diccionarios con los resultados
         """
+        results, _ = self.execute_query_with_stats(query, database)
+        return results
+    
+    def execute_query_with_stats(self, query: str, database: Optional[str] = None,
+                                 execution_parameters: Optional[List[str]] = None,
+                                 fingerprint: Optional[str] = None,
+                                 reuse_results: bool = True,
+                                 on_started: Optional[Callable[[str], None]] = None) -> Tuple[List[Dict[str, Any]], QueryStats]:
+        """
+        Ejecuta una query en Athena y devuelve los resultados junto a sus estadísticas
+        
+        Args:
+            query: Query SQL a ejecutar
+            database: Base de datos (opcional, usa self.database por defecto)
+            execution_parameters: Valores para los '?' de la query (opcional)
+            fingerprint: Fingerprint de la query (opcional, se calcula si falta)
+            reuse_results: Permitir resultados previos (False tras una nueva ingesta)
+            on_started: Se llama con el QueryExecutionId apenas Athena acepta la query
+            
+        Returns:
+            Tupla (resultados, estadísticas de esta ejecución)
+        """
         start_time = time.time()
         db = database or self.database
+        fingerprint = fingerprint or query_fingerprint(query, execution_parameters)
+        
+        reuse_max_age = self._reuse_max_age_seconds() if reuse_results else 0
+        if reuse_max_age > 0:
+            reused = self._get_registered_results(fingerprint, db, start_time, reuse_max_age)
+            if reused:
+                return reused
         
         try:
             logger.info(f"Ejecutando query en Athena: {query[:100]}...")
             
+            params = {
+                'QueryString': query,
+                'QueryExecutionContext': {'Database': db},
+                'ResultConfiguration': {'OutputLocation': self.output_location},
+                'WorkGroup': self.workgroup
+            }
+            if execution_parameters:
+                params['ExecutionParameters'] = execution_parameters
+            # Athena acepta edades en minutos: en el primer minuto tras una ingesta no se reutiliza
+            if reuse_max_age >= 60:
+                params['ResultReuseConfiguration'] = {
+                    'ResultReuseByAgeConfiguration': {
+                        'Enabled': True,
+                        'MaxAgeInMinutes': reuse_max_age // 60
+                    }
+                }
+            
             # Iniciar ejecución de query
-            response = self.athena.start_query_execution(
-                QueryString=query,
-                QueryExecutionContext={'Database': db},
-                ResultConfiguration={'OutputLocation': self.output_location}
-            )
+            response = self.athena.start_query_execution(**params)
             
             query_execution_id = response['QueryExecutionId']
             logger.info(f"Query ID: {query_execution_id}")
+            if on_started:
+                on_started(query_execution_id)
             
             # Esperar a que la query termine
-            self._wait_for_query_completion(query_execution_id)
+            query_execution = self._wait_for_query_completion(query_execution_id)
             
             # Obtener resultados
             results = self._get_query_results(query_execution_id)
             
             execution_time = int((time.time() - start_time) * 1000)
-            self.last_execution_time_ms = execution_time
+            stats = QueryStats.from_execution(query_execution, execution_time, fingerprint)
+            
+            if self.result_registry:
+                completed_at = query_execution['Status'].get('CompletionDateTime')
+                try:
+                    self.result_registry.record(
+                        fingerprint, db, query_execution_id,
+                        completed_at.timestamp() if completed_at else None
+                    )
+                except sqlite3.Error as e:
+                    logger.warning(f"No se pudo registrar el resultado {query_execution_id}: {e}")
             
-            logger.info(f"Query completada en {execution_time}ms - {len(results)} filas")
+            logger.info(
+                f"Query completada en {execution_time}ms - {len(results)} filas - "
+                f"{stats.data_scanned_bytes} bytes escaneados"
+            )
             
-            return results
+            return results, stats
             
         except Exception as e:
             logger.error(f"Error ejecutando query: {e}")
             raise
     
-    def _wait_for_query_completion(self, query_execution_id: str, max_wait_time: int = 60):
+    def _reuse_max_age_seconds(self) -> int:
+        """
+        Antigüedad máxima de un resultado reutilizable
+        
+        Es ATHENA_RESULT_REUSE_MAX_AGE_MINUTES, acotada al tiempo transcurrido
+        desde la última ingesta (un resultado anterior ya no refleja el DataLake).
+        
+        Returns:
+            Segundos (0 si no se puede reutilizar)
+        """
+        max_age = self.result_reuse_max_age_minutes * 60
+        if max_age > 0 and self.ingestion_watermark:
+            try:
+                ingested_at = self.ingestion_watermark()
+            except Exception as e:
+                # Sin saber cuándo fue la última ingesta no se reutiliza nada
+                logger.warning(f"No se pudo leer la marca de la última ingesta: {e}")
+                return 0
+            if ingested_at:
+                max_age = min(max_age, int(time.time() - ingested_at))
+        return max(max_age, 0)
+    
+    def _get_registered_results(self, fingerprint: str, database: str, start_time: float,
+                                max_age_seconds: int) -> Optional[Tuple[List[Dict[str, Any]], QueryStats]]:
+        """
+        Lee el resultado de una ejecución previa registrada para la misma query
+        
+        Args:
+            fingerprint: Fingerprint de la query
+            database: Base de datos de la query
+            start_time: Inicio de la request (para medir el tiempo total)
+            max_age_seconds: Antigüedad máxima del resultado
+            
+        Returns:
+            Tupla (resultados, estadísticas) o None si no hay un resultado vigente
+        """
+        if not self.result_registry:
+            return None
+        
+        try:
+            entry = self.result_registry.lookup(fingerprint, database, max_age_seconds)
+        except sqlite3.Error as e:
+            # Un registro no disponible (p.ej. 'database is locked') no debe hacer fallar la query
+            logger.warning(f"No se pudo consultar el registro de resultados: {e}")
+            return None
+        if not entry:
+            return None
+        
+        query_execution_id, completed_at = entry
+        try:
+            results = self._get_query_results(query_execution_id)
+        except Exception as e:
+            # El resultado pudo expirar o borrarse del bucket: se vuelve a ejecutar
+            logger.warning(f"No se pudo reutilizar {query_execution_id}: {e}")
+            try:
+                self.result_registry.forget(fingerprint, database)
+            except sqlite3.Error as e:
+                logger.warning(f"No se pudo quitar {query_execution_id} del registro de resultados: {e}")
+            return None
+        
+        execution_time = int((time.time() - start_time) * 1000)
+        logger.info(
+            f"Reutilizando resultado {query_execution_id} "
+            f"({int(time.time() - completed_at)}s de antigüedad) - {len(results)} filas"
+        )
+        
+        return results, QueryStats(
+            query_execution_id=query_execution_id,
+            execution_time_ms=execution_time,
+            reused_result=True,
+            fingerprint=fingerprint
+        )
+    
+    def execute_statement_with_stats(self, name: str, statement: str, parameters: Sequence = (),
+                                     database: Optional[str] = None,
+                                     reuse_results: bool = True,
+                                     on_started: Optional[Callable[[str], None]] = None) -> Tuple[List[Dict[str, Any]], QueryStats]:
+        """
+        Ejecuta una query como prepared statement (EXECUTE ... USING)
+        
+        El texto enviado a Athena es el mismo para cualquier valor de los
+        parámetros. Si el statement no se puede registrar (p.ej. sin permisos
+        athena:CreatePreparedStatement) se ejecuta con los valores sustituidos.
+        
+        Args:
+            name: Nombre lógico de la query (p.ej. clave en PREDEFINED_QUERIES)
+            statement: Query SQL con placeholders '?'
+            parameters: Valores en el orden de los placeholders
+            database: Base de datos (opcional, usa self.database por defecto)
+            reuse_results: Permitir resultados previos (False tras una nueva ingesta)
+            on_started: Se llama con el QueryExecutionId apenas Athena acepta la query
+            
+        Returns:
+            Tupla (resultados, estadísticas de esta ejecución)
+        """
+        fingerprint = query_fingerprint(statement, parameters)
+        statement_name = f"{PREPARED_STATEMENT_PREFIX}{name}"
+        
+        if self.use_prepared_statements and self._ensure_prepared_statement(statement_name, statement):
+            return self.execute_query_with_stats(
+                f"EXECUTE {statement_name}",
+                database,
+                execution_parameters=[str(value) for value in parameters] or None,
+                fingerprint=fingerprint,
+                reuse_results=reuse_results,
+                on_started=on_started
+            )
+        
+        return self.execute_query_with_stats(
+            bind_parameters(statement, parameters), database,
+            fingerprint=fingerprint, reuse_results=reuse_results, on_started=on_started
+        )
+    
+    def wait_for_execution_with_stats(self, query_execution_id: str) -> Tuple[List[Dict[str, Any]], QueryStats]:
+        """
+        Espera una ejecución iniciada por otro proceso y lee sus resultados
+        
+        Args:
+            query_execution_id: ID de la ejecución en Athena
+            
+        Returns:
+            Tupla (resultados, estadísticas de la ejecución)
+        """
+        start_time = time.time()
+        query_execution = self._wait_for_query_completion(query_execution_id)
+        results = self._get_query_results(query_execution_id)
+        
+        execution_time = int((time.time() - start_time) * 1000)
+        logger.info(f"Resultado de {query_execution_id} compartido en {execution_time}ms - {len(results)} filas")
+        
+        return results, QueryStats.from_execution(query_execution, execution_time)
+    
+    def _ensure_prepared_statement(self, statement_name: str, statement: str) -> bool:
+        """
+        Registra (o actualiza) un prepared statement en el workgroup, una vez por proceso
+        
+        Args:
+            statement_name: Nombre del statement en Athena
+            statement: Query SQL con placeholders '?'
+            
+        Returns:
+            True si el statement está disponible para EXECUTE
+        """
+        with self._prepared_lock:
+            if statement_name in self._prepared_statements:
+                return self._prepared_statements[statement_name]
+            
+            try:
+                try:
+                    current = self.athena.get_prepared_statement(
+                        StatementName=statement_name, WorkGroup=self.workgroup
+                    )['PreparedStatement']['QueryStatement']
+                except ClientError as e:
+                    if e.response['Error']['Code'] != 'ResourceNotFoundException':
+                        raise
+                    self.athena.create_prepared_statement(
+                        StatementName=statement_name, WorkGroup=self.workgroup, QueryStatement=statement
+                    )
+                    logger.info(f"Prepared statement {statement_name} creado")
+                else:
+                    if current != statement:
+                        self.athena.update_prepared_statement(
+                            StatementName=statement_name, WorkGroup=self.workgroup, QueryStatement=statement
+                        )
+                        logger.info(f"Prepared statement {statement_name} actualizado")
+                
+                self._prepared_statements[statement_name] = True
+            except ClientError as e:
+                logger.warning(f"No se pudo registrar {statement_name}, se ejecutará inline: {e}")
+                self._prepared_statements[statement_name] = False
+            
+            return self._prepared_statements[statement_name]
+    
+    def check_connection(self):
+        """
+        Verifica que Athena responde (GetWorkGroup, sin ejecutar una query)
+        
+        Si el rol no tiene athena:GetWorkGroup se verifica con 'SELECT 1'
+        (no escanea datos), que solo requiere los permisos que ya usa la API.
+        
+        Raises:
+            ClientError: Si Athena no es accesible
+        """
+        if self._workgroup_check:
+            try:
+                self.athena.get_work_group(WorkGroup=self.workgroup)
+                return
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'AccessDeniedException':
+                    raise
+                logger.warning(f"Sin permiso athena:GetWorkGroup, el health check usará SELECT 1: {e}")
+                self._workgroup_check = False
+        
+        self.execute_query_with_stats("SELECT 1", reuse_results=False)
+    
+    def _wait_for_query_completion(self, query_execution_id: str, max_wait_time: int = 60) -> Dict[str, Any]:
         """
         Espera a que la query termine de ejecutarse
         
         Args:
             query_execution_id: ID de la ejecución de la query
             max_wait_time: Tiempo máximo de espera en segundos
+            
+        Returns:
+            Campo 'QueryExecution' de la última respuesta (incluye Statistics)
         """
         start_time = time.time()
         
@@ -91,7 +415,7 @@ class AthenaClient:
             
             if status in ['SUCCEEDED']:
                 logger.info(f"Query {query_execution_id} completada exitosamente")
-                return
+                return response['QueryExecution']
             
             if status in ['FAILED', 'CANCELLED']:
                 reason = response['QueryExecution']['Status'].get('StateChangeReason', 'Unknown')
@@ -0,0 +1,3 @@
+"""
+Benchmark de carga de la API con clientes AWS simulados (ver run.py)
+"""
@@ -0,0 +1,161 @@
+"""
+Clientes falsos de Athena, Glue y S3 para el benchmark
+
+Reemplazan a los clientes boto3 de AthenaClient: no hacen llamadas de red ni
+escanean datos reales. Cada ejecución pasa por QUEUED y RUNNING durante los
+tiempos configurados y devuelve un resultado sintético del tamaño pedido,
+paginado como get_query_results (1000 filas por página).
+"""
+
+import itertools
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from botocore.exceptions import ClientError
+
+# Columnas de las tablas que usan las queries personalizadas del benchmark
+TABLE_COLUMNS = {
+    "mysql_ms1_orders": ["id", "user_id", "total_amount", "status", "created_at"],
+    "mysql_ms1_users": ["id", "username", "email", "created_at"],
+    "postgres_ms2_invoices": ["id", "customer_id", "amount", "status", "issue_date"],
+}
+PARTITION_KEYS = ["year", "month", "day"]
+
+
+class FakeAthena:
+    """Athena simulado con demoras de cola/ejecución y resultados sintéticos"""
+
+    def __init__(self, queue_delay: float = 0.1, run_delay: float = 0.5, rows: int = 100,
+                 columns: int = 5, value_size: int = 12, scanned_bytes: int = 10 * 1024 ** 2):
+        """
+        Args:
+            queue_delay: Segundos en estado QUEUED
+            run_delay: Segundos en estado RUNNING
+            rows: Filas de cada resultado
+            columns: Columnas de cada resultado
+            value_size: Caracteres de cada valor
+            scanned_bytes: DataScannedInBytes reportado por ejecución
+        """
+        self.queue_delay = queue_delay
+        self.run_delay = run_delay
+        self.rows = rows
+        self.columns = columns
+        self.value_size = value_size
+        self.scanned_bytes = scanned_bytes
+        self.started = 0
+        self.prepared_statements: Dict[str, str] = {}
+        self._executions: Dict[str, float] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._pages: Optional[List[List[Dict[str, Any]]]] = None
+
+    def start_query_execution(self, **params) -> Dict[str, str]:
+        with self._lock:
+            query_execution_id = f"bench-{next(self._ids)}"
+            self._executions[query_execution_id] = time.time()
+            self.started += 1
+        return {"QueryExecutionId": query_execution_id}
+
+    def get_query_execution(self, QueryExecutionId: str) -> Dict[str, Any]:
+        elapsed = time.time() - self._executions[QueryExecutionId]
+        if elapsed < self.queue_delay:
+            state = "QUEUED"
+        elif elapsed < self.queue_delay + self.run_delay:
+            state = "RUNNING"
+        else:
+            state = "SUCCEEDED"
+
+        return {"QueryExecution": {
+            "QueryExecutionId": QueryExecutionId,
+            "Status": {"State": state},
+            "Statistics": {
+                "QueryQueueTimeInMillis": int(self.queue_delay * 1000),
+                "EngineExecutionTimeInMillis": int(self.run_delay * 1000),
+                "DataScannedInBytes": self.scanned_bytes if state == "SUCCEEDED" else 0,
+            },
+        }}
+
+    def _result_pages(self) -> List[List[Dict[str, Any]]]:
+        """Filas del resultado (con header en la primera página), generadas una sola vez"""
+        if self._pages is None:
+            names = [f"col_{i}" for i in range(self.columns)]
+            rows = [{"Data": [{"VarCharValue": name} for name in names]}]
+            rows += [
+                {"Data": [{"VarCharValue": str(row * self.columns + i).zfill(self.value_size)}
+                          for i in range(self.columns)]}
+                for row in range(self.rows)
+            ]
+            self._pages = [rows[start:start + 1000] for start in range(0, len(rows), 1000)]
+        return self._pages
+
+    def get_query_results(self, QueryExecutionId: str, MaxResults: int = 1000,
+                          NextToken: Optional[str] = None) -> Dict[str, Any]:
+        pages = self._result_pages()
+        page = int(NextToken or 0)
+        response = {"ResultSet": {
+            "ResultSetMetadata": {"ColumnInfo": [{"Name": f"col_{i}"} for i in range(self.columns)]},
+            "Rows": pages[page],
+        }}
+        if page + 1 < len(pages):
+            response["NextToken"] = str(page + 1)
+        return response
+
+    def get_work_group(self, WorkGroup: str) -> Dict[str, Any]:
+        return {"WorkGroup": {"Name": WorkGroup, "State": "ENABLED"}}
+
+    def get_prepared_statement(self, StatementName: str, WorkGroup: str) -> Dict[str, Any]:
+        if StatementName not in self.prepared_statements:
+            raise ClientError({"Error": {"Code": "ResourceNotFoundException", "Message": StatementName}},
+                              "GetPreparedStatement")
+        return {"PreparedStatement": {"QueryStatement": self.prepared_statements[StatementName]}}
+
+    def create_prepared_statement(self, StatementName: str, WorkGroup: str, QueryStatement: str):
+        self.prepared_statements[StatementName] = QueryStatement
+
+    update_prepared_statement = create_prepared_statement
+
+
+class _Paginator:
+    """Paginador de una sola página"""
+
+    def __init__(self, page: Dict[str, Any]):
+        self.page = page
+
+    def paginate(self, **params):
+        return [self.page]
+
+
+class FakeGlue:
+    """Glue Data Catalog con las tablas de TABLE_COLUMNS (particionadas por fecha)"""
+
+    def __init__(self, table_bytes: int = 50 * 1024 ** 2, partitions: int = 30):
+        """
+        Args:
+            table_bytes: Tamaño reportado de cada tabla (sizeKey)
+            partitions: Particiones por tabla (el tamaño se reparte entre ellas)
+        """
+        self.table_bytes = table_bytes
+        self.partitions = partitions
+
+    def get_table(self, DatabaseName: str, Name: str) -> Dict[str, Any]:
+        if Name not in TABLE_COLUMNS:
+            raise ClientError({"Error": {"Code": "EntityNotFoundException", "Message": Name}}, "GetTable")
+        return {"Table": {
+            "Name": Name,
+            "StorageDescriptor": {"Columns": [{"Name": column, "Type": "string"} for column in TABLE_COLUMNS[Name]]},
+            "PartitionKeys": [{"Name": key, "Type": "string"} for key in PARTITION_KEYS],
+            "Parameters": {"sizeKey": str(self.table_bytes)},
+        }}
+
+    def get_paginator(self, operation: str) -> _Paginator:
+        # get_partitions: el filtro selecciona una partición
+        size = self.table_bytes // max(self.partitions, 1)
+        return _Paginator({"Partitions": [{"Parameters": {"sizeKey": str(size)}}]})
+
+
+class FakeS3:
+    """S3 vacío (el benchmark no usa el motor local)"""
+
+    def get_paginator(self, operation: str) -> _Paginator:
+        return _Paginator({"Contents": []})
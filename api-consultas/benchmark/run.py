@@ -0,0 +1,454 @@
+"""
+Benchmark de carga de la API con Athena simulado
+
+Levanta main.app en el mismo proceso (httpx + ASGITransport, con lifespan),
+reemplaza los clientes boto3 de AthenaClient por los de fake_aws y ejecuta
+requests concurrentes contra todos los endpoints durante un tiempo fijo.
+
+Reporta req/s, latencias p50/p95/p99 por endpoint, bloqueo del event loop y
+memoria. Con --baseline compara contra un resultado anterior (--output) y
+termina con código 1 si hay una regresión mayor a --max-regression.
+
+Uso (desde api-consultas/):
+    python -m benchmark.run --duration 20 --concurrency 50
+    python -m benchmark.run --output base.json
+    python -m benchmark.run --baseline base.json --max-regression 0.2
+"""
+
+import argparse
+import asyncio
+import heapq
+import json
+import math
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+from benchmark.fake_aws import FakeAthena, FakeGlue, FakeS3
+
+try:
+    import zstandard
+except ImportError:  # Sin zstandard la API tampoco responde en zstd
+    zstandard = None
+
+
+@dataclass
+class Scenario:
+    """Request de un endpoint (build recibe el random del worker y devuelve path y body)"""
+    name: str
+    method: str
+    build: Callable[[random.Random, bool], tuple]
+    default: bool = True
+
+
+def _get(path: str) -> Callable:
+    return lambda rng, unique: (path, None)
+
+
+def _limit(path: str) -> Callable:
+    # Con unique, parámetros distintos generan claves de cache distintas
+    return lambda rng, unique: (f"{path}?limit={rng.randint(1, 100) if unique else 10}", None)
+
+
+def _threshold(rng: random.Random, unique: bool) -> tuple:
+    return f"/api/inventario/bajo-stock?threshold={rng.randint(1, 1000) if unique else 100}", None
+
+
+def _custom(rng: random.Random, unique: bool) -> tuple:
+    amount = rng.randint(1, 10000) if unique else 100
+    query = (
+        "SELECT status, COUNT(*) AS ordenes FROM mysql_ms1_orders "
+        f"WHERE total_amount > {amount} AND year = '2025' GROUP BY status"
+    )
+    return "/api/query/custom", {"query": query}
+
+
+def _batch(rng: random.Random, unique: bool) -> tuple:
+    limit = rng.randint(1, 100) if unique else 10
+    return "/api/batch", {"queries": [
+        {"query": "ventas_resumen"},
+        {"query": "clientes_top", "params": {"limit": limit}},
+        {"query": "envios_estado"},
+    ]}
+
+
+SCENARIOS = [
+    Scenario("root", "GET", _get("/")),
+    Scenario("health", "GET", _get("/health")),
+    Scenario("metrics", "GET", _get("/metrics")),
+    Scenario("queries_list", "GET", _get("/api/queries/list")),
+    Scenario("ventas_resumen", "GET", _get("/api/ventas/resumen")),
+    Scenario("ventas_por_usuario", "GET", _get("/api/ventas/por-usuario")),
+    Scenario("ventas_por_estado", "GET", _get("/api/ventas/por-estado")),
+    Scenario("productos_top", "GET", _limit("/api/productos/top")),
+    Scenario("clientes_top", "GET", _limit("/api/clientes/top")),
+    Scenario("facturas_estado", "GET", _get("/api/facturas/estado")),
+    Scenario("inventario_bajo_stock", "GET", _threshold),
+    Scenario("envios_estado", "GET", _get("/api/envios/estado")),
+    Scenario("dashboard", "GET", _get("/api/dashboard")),
+    Scenario("custom", "POST", _custom),
+    Scenario("batch", "POST", _batch),
+    # Vence todo el cache: solo si se pide con --endpoints
+    Scenario("cache_refresh", "POST", lambda rng, unique: ("/api/cache/refresh", None), default=False),
+]
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Percentil p (0-100) por rango más cercano"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(math.ceil(p / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def failed_response(response: httpx.Response) -> bool:
+    """True si el request falló (código de error o success=false en el JSON de una query)"""
+    if response.status_code >= 400:
+        return True
+    if response.status_code != 200 or not response.headers.get("content-type", "").startswith("application/json"):
+        return False
+
+    body = response.content
+    # httpx no decodifica zstd: se descomprime aquí
+    if response.headers.get("content-encoding") == "zstd" and zstandard:
+        body = zstandard.ZstdDecompressor().decompress(body)
+    payload = json.loads(body)
+    return isinstance(payload, dict) and payload.get("success") is False
+
+
+def configure_environment(args: argparse.Namespace, workdir: str):
+    """Variables de entorno de main.py (deben fijarse antes de importarlo)"""
+    os.environ.update({
+        "AWS_DEFAULT_REGION": "us-east-1",
+        "LOG_LEVEL": args.log_level,
+        "RESULT_REGISTRY_PATH": os.path.join(workdir, "result_registry.db"),
+        "ATHENA_RESULT_REUSE_MAX_AGE_MINUTES": str(args.result_reuse_minutes),
+        "CACHE_BACKEND": args.cache_backend,
+        "CACHE_SQLITE_PATH": os.path.join(workdir, "result_cache.db"),
+        "CACHE_TTL_SECONDS": str(args.cache_ttl),
+        "CACHE_STALE_TTL_SECONDS": str(args.cache_ttl),
+        "CACHE_WARM_QUERIES": "none",
+        "LOCAL_ENGINE_ENABLED": "false",
+    })
+
+
+class BlockingMonitor:
+    """
+    Mide cada callback del event loop (mientras corre, el loop no atiende otros requests)
+
+    Cliente y API comparten el loop y lo saturan, así que el atraso de un
+    sleep mediría la cola y no el bloqueo: se cronometra asyncio.Handle._run.
+    """
+
+    def __init__(self, threshold_seconds: float, keep: int = 5):
+        """
+        Args:
+            threshold_seconds: Duración a partir de la cual un callback se considera bloqueante
+            keep: Cantidad de callbacks más largos a reportar
+        """
+        self.threshold_seconds = threshold_seconds
+        self.keep = keep
+        self.max_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self.slow_callbacks = 0
+        self.worst: List[tuple] = []
+        self._original = None
+
+    @staticmethod
+    def _describe(handle) -> str:
+        """Nombre de la corutina (si el callback es un paso de una Task) o del callback"""
+        callback = getattr(handle, "_callback", None)
+        task = getattr(callback, "__self__", None)
+        if isinstance(task, asyncio.Task):
+            return task.get_coro().__qualname__
+        return getattr(callback, "__qualname__", repr(callback))
+
+    def start(self):
+        self._original = original = asyncio.events.Handle._run
+        monitor = self
+
+        def timed_run(handle):
+            start = time.perf_counter()
+            try:
+                return original(handle)
+            finally:
+                elapsed = time.perf_counter() - start
+                if elapsed > monitor.max_seconds:
+                    monitor.max_seconds = elapsed
+                if elapsed >= monitor.threshold_seconds:
+                    monitor.slow_callbacks += 1
+                    monitor.blocked_seconds += elapsed
+                    item = (elapsed, monitor._describe(handle))
+                    if len(monitor.worst) < monitor.keep:
+                        heapq.heappush(monitor.worst, item)
+                    else:
+                        heapq.heappushpop(monitor.worst, item)
+
+        asyncio.events.Handle._run = timed_run
+
+    def stop(self):
+        if self._original:
+            asyncio.events.Handle._run = self._original
+            self._original = None
+
+
+async def run_load(app, scenarios: List[Scenario], args: argparse.Namespace) -> Dict[str, Any]:
+    """Ejecuta la carga y devuelve las mediciones crudas"""
+    latencies: Dict[str, List[float]] = {scenario.name: [] for scenario in scenarios}
+    errors: Dict[str, int] = {scenario.name: 0 for scenario in scenarios}
+    not_modified: Dict[str, int] = {scenario.name: 0 for scenario in scenarios}
+    response_bytes: Dict[str, int] = {scenario.name: 0 for scenario in scenarios}
+    etags: Dict[str, str] = {}
+    monitor = BlockingMonitor(args.block_threshold_ms / 1000)
+
+    headers = {"accept-encoding": args.accept_encoding} if args.accept_encoding else {}
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers,
+                                 timeout=args.timeout) as client:
+
+        async def worker(worker_id: int, deadline: float, record: bool):
+            rng = random.Random(args.seed + worker_id)
+            while time.perf_counter() < deadline:
+                scenario = rng.choice(scenarios)
+                path, body = scenario.build(rng, rng.random() < args.unique_ratio)
+                request_headers = {}
+                if args.etag and path in etags:
+                    request_headers["if-none-match"] = etags[path]
+
+                start = time.perf_counter()
+                try:
+                    response = await client.request(scenario.method, path, json=body, headers=request_headers)
+                    failed = failed_response(response)
+                except Exception:
+                    response, failed = None, True
+                elapsed = time.perf_counter() - start
+                # Con ASGITransport un request servido desde cache no suspende nunca: sin ceder el
+                # loop un worker acapararía el proceso (en un servidor real cada conexión cede)
+                await asyncio.sleep(0)
+
+                if response is not None and response.headers.get("etag"):
+                    etags[path] = response.headers["etag"]
+                if not record:
+                    continue
+
+                latencies[scenario.name].append(elapsed)
+                errors[scenario.name] += failed
+                if response is not None:
+                    not_modified[scenario.name] += response.status_code == 304
+                    response_bytes[scenario.name] += int(response.headers.get("content-length", 0))
+
+        # Warmup: llena caches y prepared statements sin registrar mediciones
+        if args.warmup > 0:
+            deadline = time.perf_counter() + args.warmup
+            await asyncio.gather(*[worker(i, deadline, False) for i in range(args.concurrency)])
+
+        monitor.start()
+        if args.tracemalloc:
+            tracemalloc.start()
+
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*[worker(i, deadline, True) for i in range(args.concurrency)])
+        elapsed = time.perf_counter() - start
+
+        traced = tracemalloc.get_traced_memory() if args.tracemalloc else None
+        if args.tracemalloc:
+            tracemalloc.stop()
+        monitor.stop()
+
+    return {
+        "elapsed": elapsed,
+        "latencies": latencies,
+        "errors": errors,
+        "not_modified": not_modified,
+        "response_bytes": response_bytes,
+        "monitor": monitor,
+        "traced": traced,
+    }
+
+
+def summarize(raw: Dict[str, Any], fake_athena: FakeAthena, args: argparse.Namespace) -> Dict[str, Any]:
+    """Resume las mediciones (req/s, percentiles en ms, lag, memoria)"""
+    elapsed = raw["elapsed"]
+    endpoints = {}
+    for name, values in raw["latencies"].items():
+        if not values:
+            continue
+        endpoints[name] = {
+            "requests": len(values),
+            "rps": len(values) / elapsed,
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+            "max_ms": max(values) * 1000,
+            "errors": raw["errors"][name],
+            "not_modified": raw["not_modified"][name],
+            "avg_bytes": raw["response_bytes"][name] // len(values),
+        }
+
+    all_latencies = [value for values in raw["latencies"].values() for value in values]
+    monitor = raw["monitor"]
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+    return {
+        "config": {key: value for key, value in vars(args).items() if key not in ("baseline", "output")},
+        "total": {
+            "requests": len(all_latencies),
+            "rps": len(all_latencies) / elapsed,
+            "p50_ms": percentile(all_latencies, 50) * 1000,
+            "p95_ms": percentile(all_latencies, 95) * 1000,
+            "p99_ms": percentile(all_latencies, 99) * 1000,
+            "errors": sum(raw["errors"].values()),
+        },
+        "endpoints": endpoints,
+        "event_loop": {
+            "max_block_ms": monitor.max_seconds * 1000,
+            "threshold_ms": args.block_threshold_ms,
+            "slow_callbacks": monitor.slow_callbacks,
+            "blocked_ms": monitor.blocked_seconds * 1000,
+            "worst": [{"ms": elapsed * 1000, "callback": name}
+                      for elapsed, name in sorted(monitor.worst, reverse=True)],
+        },
+        "memory": {
+            "max_rss_bytes": max_rss,
+            "traced_current_bytes": raw["traced"][0] if raw["traced"] else None,
+            "traced_peak_bytes": raw["traced"][1] if raw["traced"] else None,
+        },
+        "athena_executions": fake_athena.started,
+    }
+
+
+def print_report(summary: Dict[str, Any]):
+    total = summary["total"]
+    print(f"\n{total['requests']} requests - {total['rps']:.1f} req/s - "
+          f"p50 {total['p50_ms']:.1f}ms p95 {total['p95_ms']:.1f}ms p99 {total['p99_ms']:.1f}ms - "
+          f"{total['errors']} errores\n")
+
+    print(f"{'endpoint':<24}{'reqs':>7}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'304':>6}{'err':>6}{'bytes':>9}")
+    for name, stats in summary["endpoints"].items():
+        print(f"{name:<24}{stats['requests']:>7}{stats['rps']:>9.1f}{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}"
+              f"{stats['p99_ms']:>9.1f}{stats['max_ms']:>9.1f}{stats['not_modified']:>6}{stats['errors']:>6}"
+              f"{stats['avg_bytes']:>9}")
+
+    loop = summary["event_loop"]
+    memory = summary["memory"]
+    print(f"\nEvent loop: callback más largo {loop['max_block_ms']:.1f}ms, "
+          f"{loop['slow_callbacks']} callbacks >= {loop['threshold_ms']}ms (bloqueado {loop['blocked_ms']:.0f}ms en total)")
+    for worst in loop["worst"]:
+        print(f"  {worst['ms']:>8.1f}ms  {worst['callback']}")
+    print(f"Memoria: RSS máximo {memory['max_rss_bytes'] / 1024 ** 2:.1f} MB", end="")
+    if memory["traced_peak_bytes"] is not None:
+        print(f", tracemalloc actual {memory['traced_current_bytes'] / 1024 ** 2:.1f} MB "
+              f"/ pico {memory['traced_peak_bytes'] / 1024 ** 2:.1f} MB", end="")
+    print(f"\nEjecuciones en Athena (fake): {summary['athena_executions']}")
+
+
+def compare(summary: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """
+    Compara req/s y p95 contra un resultado anterior
+
+    Returns:
+        Lista de regresiones mayores a max_regression (vacía si no hay)
+    """
+    regressions = []
+    if summary["total"]["rps"] < baseline["total"]["rps"] * (1 - max_regression):
+        regressions.append(f"req/s total: {baseline['total']['rps']:.1f} -> {summary['total']['rps']:.1f}")
+
+    for name, stats in summary["endpoints"].items():
+        previous = baseline["endpoints"].get(name)
+        if previous and stats["p95_ms"] > previous["p95_ms"] * (1 + max_regression):
+            regressions.append(f"p95 {name}: {previous['p95_ms']:.1f}ms -> {stats['p95_ms']:.1f}ms")
+
+    return regressions
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark de carga de api-consultas con Athena simulado")
+    parser.add_argument("--duration", type=float, default=10, help="Segundos de medición")
+    parser.add_argument("--warmup", type=float, default=2, help="Segundos de calentamiento (no se miden)")
+    parser.add_argument("--concurrency", type=int, default=20, help="Requests simultáneos")
+    parser.add_argument("--endpoints", default="", help="Escenarios separados por coma (vacío = todos menos cache_refresh)")
+    parser.add_argument("--unique-ratio", type=float, default=0.1,
+                        help="Fracción de requests con parámetros distintos (fallan el cache)")
+    parser.add_argument("--etag", action="store_true", help="Reenviar el último ETag (If-None-Match)")
+    parser.add_argument("--accept-encoding", default="", help="Accept-Encoding de los requests (p.ej. 'zstd' o 'gzip')")
+    parser.add_argument("--queue-delay", type=float, default=0.1, help="Segundos en cola de cada ejecución")
+    parser.add_argument("--run-delay", type=float, default=0.5, help="Segundos de ejecución de cada query")
+    parser.add_argument("--rows", type=int, default=100, help="Filas de cada resultado")
+    parser.add_argument("--columns", type=int, default=5, help="Columnas de cada resultado")
+    parser.add_argument("--cache-ttl", type=int, default=300, help="CACHE_TTL_SECONDS (0 = sin cache)")
+    parser.add_argument("--cache-backend", default="memory", choices=["memory", "sqlite", "redis"])
+    parser.add_argument("--result-reuse-minutes", type=int, default=0, help="ATHENA_RESULT_REUSE_MAX_AGE_MINUTES")
+    parser.add_argument("--timeout", type=float, default=120, help="Timeout de cada request")
+    parser.add_argument("--block-threshold-ms", type=float, default=10,
+                        help="Duración de un callback del event loop que se cuenta como bloqueo")
+    parser.add_argument("--tracemalloc", action="store_true", help="Medir memoria con tracemalloc (agrega overhead)")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Guardar el resumen en JSON")
+    parser.add_argument("--baseline", help="Resumen JSON anterior para detectar regresiones")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="Regresión tolerada (0.2 = 20%%)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+
+    names = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+    scenarios = [scenario for scenario in SCENARIOS if (scenario.name in names if names else scenario.default)]
+    unknown = set(names) - {scenario.name for scenario in SCENARIOS}
+    if unknown or not scenarios:
+        print(f"Escenarios desconocidos: {', '.join(sorted(unknown))}. "
+              f"Disponibles: {', '.join(scenario.name for scenario in SCENARIOS)}")
+        return 2
+
+    with tempfile.TemporaryDirectory(prefix="api-bench-") as workdir:
+        configure_environment(args, workdir)
+        import main as api
+
+        fake_athena = FakeAthena(queue_delay=args.queue_delay, run_delay=args.run_delay,
+                                 rows=args.rows, columns=args.columns)
+        api.athena_client.athena = fake_athena
+        api.athena_client.glue = api.query_guard.estimator.glue = FakeGlue()
+        api.athena_client.s3 = api.query_guard.estimator.s3 = FakeS3()
+
+        async def run():
+            async with api.lifespan(api.app):
+                return await run_load(api.app, scenarios, args)
+
+        raw = asyncio.run(run())
+
+    summary = summarize(raw, fake_athena, args)
+    print_report(summary)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+        print(f"\nResumen guardado en {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(summary, json.load(f), args.max_regression)
+        if regressions:
+            print("\nRegresiones:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return 1
+        print("\nSin regresiones respecto al baseline")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
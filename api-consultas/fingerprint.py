@@ -0,0 +1,140 @@
+"""
+Normalización y fingerprint de queries SQL
+
+Dos queries que solo difieren en espacios, comentarios o mayúsculas producen
+el mismo texto normalizado (y por lo tanto reutilizan resultados en Athena),
+y el fingerprint separa la forma de la query de sus literales.
+"""
+
+import hashlib
+import json
+import re
+from typing import List, Optional, Sequence, Tuple
+
+# Tokens SQL relevantes para normalizar (el orden de las alternativas importa)
+_TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<string>'(?:[^']|'')*')              # literal de texto ('' escapa comilla)
+    | (?P<quoted>"(?:[^"]|"")*")            # identificador entre comillas
+    | (?P<line_comment>--[^\n]*)
+    | (?P<block_comment>/\*.*?\*/)
+    | (?P<number>(?<![\w.])\d+(?:\.\d+)?(?:[eE][+-]?\d+)?(?![\w.]))
+    | (?P<space>\s+)
+    | (?P<other>.)
+    """,
+    re.VERBOSE | re.DOTALL
+)
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normaliza el texto de una query sin cambiar su semántica
+
+    Elimina comentarios, colapsa espacios, pasa a minúsculas todo lo que no
+    sea literal o identificador entre comillas y quita el ';' final.
+
+    Args:
+        query: Query SQL original
+
+    Returns:
+        Query SQL normalizada
+    """
+    parts = []
+    pending_space = False
+
+    for match in _TOKEN_PATTERN.finditer(query):
+        kind = match.lastgroup
+        text = match.group()
+
+        if kind in ("space", "line_comment", "block_comment"):
+            pending_space = bool(parts)
+            continue
+
+        if pending_space:
+            parts.append(" ")
+            pending_space = False
+
+        parts.append(text if kind in ("string", "quoted") else text.lower())
+
+    return "".join(parts).rstrip(";").rstrip()
+
+
+def parameterize_query(query: str) -> Tuple[str, List[str]]:
+    """
+    Reemplaza los literales de texto y numéricos por '?'
+
+    Args:
+        query: Query SQL (normalizada o no)
+
+    Returns:
+        Tupla (plantilla normalizada, literales en orden de aparición)
+    """
+    template = []
+    literals = []
+
+    for match in _TOKEN_PATTERN.finditer(normalize_query(query)):
+        if match.lastgroup in ("string", "number"):
+            template.append("?")
+            literals.append(match.group())
+        else:
+            template.append(match.group())
+
+    return "".join(template), literals
+
+
+def bind_parameters(statement: str, parameters: Sequence) -> str:
+    """
+    Sustituye los '?' de un statement por sus valores (inverso de parameterize_query)
+
+    Los valores de texto ya deben venir como literales SQL (con comillas);
+    los numéricos se insertan tal cual.
+
+    Args:
+        statement: Query SQL con placeholders '?'
+        parameters: Valores en el orden de los placeholders
+
+    Returns:
+        Query SQL lista para ejecutar
+
+    Raises:
+        ValueError: Si la cantidad de valores no coincide con los placeholders
+    """
+    parts = []
+    values = iter(parameters)
+
+    for match in _TOKEN_PATTERN.finditer(statement):
+        if match.group() == "?" and match.lastgroup == "other":
+            try:
+                parts.append(str(next(values)))
+            except StopIteration:
+                raise ValueError("Faltan valores para los placeholders del statement")
+        else:
+            parts.append(match.group())
+
+    if next(values, None) is not None:
+        raise ValueError("Sobran valores para los placeholders del statement")
+
+    return "".join(parts)
+
+
+def query_fingerprint(query: str, parameters: Optional[Sequence] = None) -> str:
+    """
+    Calcula un fingerprint estable de una query y sus valores
+
+    La query se normaliza y se separa en plantilla + literales, de modo que
+    la misma consulta escrita con otro formato (o ejecutada como prepared
+    statement con los mismos valores) produce el mismo fingerprint.
+
+    Args:
+        query: Query SQL (puede contener placeholders '?')
+        parameters: Valores de los placeholders (opcional)
+
+    Returns:
+        Hash SHA-256 en hexadecimal
+    """
+    if parameters:
+        query = bind_parameters(query, parameters)
+
+    template, literals = parameterize_query(query)
+    payload = json.dumps([template, literals], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
@@ -0,0 +1,304 @@
+"""
+Motor de consultas local (DuckDB) sobre una copia de las particiones del DataLake
+
+Las tablas son pequeñas y Athena tiene un piso de varios segundos por query,
+así que las queries predefinidas elegibles se resuelven localmente leyendo
+los mismos archivos JSON Lines (tabla/year=/month=/day=) que escribe el
+ingester. Cada tabla se carga en memoria una vez por sincronización (el JSON
+no se vuelve a parsear en cada query). Si DuckDB no está instalado, la tabla
+no está sincronizada o supera el tamaño máximo, la query sigue yendo a Athena.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import sqlglot
+from sqlglot import exp
+
+from athena_client import QueryStats
+
+try:
+    import duckdb
+except ImportError:  # Dependencia opcional
+    duckdb = None
+
+logger = logging.getLogger(__name__)
+
+# Tablas de Athena -> ubicación de sus archivos (mismos buckets/prefijos que usa el ingester)
+DEFAULT_TABLE_SOURCES = ",".join(
+    [f"mysql_ms1_{table}=s3://raw-ms1-data-bgc/{table}/" for table in ("users", "orders", "products")]
+    + [f"postgres_ms2_{table}=s3://raw-ms2-data-bgc/{table}/" for table in ("customers", "invoices", "payments")]
+    + [f"mongo_ms3_{table}=s3://raw-ms3-data-bgc/{table}/" for table in ("inventory", "shipments", "suppliers")]
+)
+
+
+def parse_table_sources(value: str) -> Dict[str, str]:
+    """
+    Parsea 'tabla=ubicación,tabla=ubicación' (ubicación: s3://bucket/prefijo/ o directorio local)
+
+    Returns:
+        Diccionario tabla -> ubicación
+    """
+    sources = {}
+    for item in value.split(","):
+        table, _, location = item.strip().partition("=")
+        if table and location:
+            sources[table.strip()] = location.strip()
+    return sources
+
+
+class LocalQueryEngine:
+    """Ejecuta queries predefinidas con DuckDB sobre la copia local del DataLake"""
+
+    def __init__(self, sources: Dict[str, str], cache_dir: str, s3_client,
+                 max_table_bytes: int, queries: Optional[List[str]] = None):
+        """
+        Inicializa el motor (no sincroniza: ver sync())
+
+        Args:
+            sources: Tabla de Athena -> ubicación (s3://... o directorio local)
+            cache_dir: Directorio donde se copian los objetos de S3
+            s3_client: Cliente boto3 de S3
+            max_table_bytes: Tamaño máximo de una tabla para ejecutarla localmente
+            queries: Claves de PREDEFINED_QUERIES que pueden ir al motor local (None = todas)
+        """
+        self.sources = sources
+        self.cache_dir = cache_dir
+        self.s3 = s3_client
+        self.max_table_bytes = max_table_bytes
+        self.queries = set(queries) if queries is not None else None
+        self.table_sizes: Dict[str, int] = {}
+        # Tamaño de los archivos con que se cargó cada tabla en DuckDB
+        self._loaded_sizes: Dict[str, int] = {}
+        self.synced_at: Optional[float] = None
+        self._statements: Dict[str, Tuple[str, List[str]]] = {}
+        self._lock = threading.Lock()
+        self._conn = duckdb.connect(database=":memory:") if duckdb else None
+        # Devuelve el epoch de la última ingesta: una copia sincronizada antes no se usa
+        self.ingestion_watermark: Optional[Callable[[], float]] = None
+
+    @property
+    def available(self) -> bool:
+        """True si DuckDB está instalado y hubo al menos una sincronización"""
+        return self._conn is not None and self.synced_at is not None
+
+    def sync(self) -> Dict[str, int]:
+        """
+        Sincroniza incrementalmente las tablas y recarga en DuckDB las que cambiaron
+
+        Solo descarga los objetos nuevos o modificados (mismo key con otro
+        tamaño) y borra los que ya no existen en S3.
+
+        Returns:
+            Diccionario tabla -> archivos descargados
+        """
+        if self._conn is None:
+            return {}
+
+        start_time = time.time()
+        downloaded = {}
+        sizes = {}
+
+        for table, location in self.sources.items():
+            try:
+                if location.startswith("s3://"):
+                    directory = os.path.join(self.cache_dir, table)
+                    downloaded[table], sizes[table] = self._sync_s3(location, directory)
+                else:
+                    directory = location
+                    downloaded[table], sizes[table] = 0, _directory_size(directory)
+            except Exception as e:
+                logger.warning(f"No se pudo sincronizar {table} desde {location}: {e}")
+                continue
+
+            if 0 < sizes[table] <= self.max_table_bytes and (
+                    downloaded[table] or self._loaded_sizes.get(table) != sizes[table]):
+                try:
+                    self._load_table(table, directory)
+                except Exception as e:
+                    logger.warning(f"No se pudo cargar {table} en DuckDB: {e}")
+                    sizes[table] = 0
+                    continue
+                self._loaded_sizes[table] = sizes[table]
+            elif sizes[table] > self.max_table_bytes and table in self._loaded_sizes:
+                # Creció por encima del máximo: va a Athena y se libera la memoria
+                self._drop_table(table)
+
+        with self._lock:
+            self.table_sizes = sizes
+            # La copia refleja al menos lo que había en S3 al empezar a listar
+            self.synced_at = start_time
+
+        logger.info(
+            f"Motor local sincronizado en {int((time.time() - start_time) * 1000)}ms - "
+            f"{sum(downloaded.values())} archivos nuevos, {len(sizes)} tablas"
+        )
+        return downloaded
+
+    def is_outdated(self) -> bool:
+        """
+        True si hubo una ingesta después de la última sincronización
+
+        Hasta que el warmer de este proceso vuelva a sincronizar, las queries
+        deben ir a Athena (la copia local no tiene los datos nuevos).
+        """
+        if not self.ingestion_watermark:
+            return False
+        try:
+            return self.synced_at is None or self.synced_at < self.ingestion_watermark()
+        except Exception as e:
+            logger.warning(f"No se pudo leer la marca de la última ingesta: {e}")
+            return True
+
+    def _sync_s3(self, location: str, directory: str) -> Tuple[int, int]:
+        """
+        Copia los objetos de un prefijo de S3 a un directorio local
+
+        Returns:
+            Tupla (archivos descargados, tamaño total local en bytes)
+        """
+        bucket, _, prefix = location[len("s3://"):].partition("/")
+        remote = {}
+        paginator = self.s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                if obj["Key"].endswith(".json"):
+                    remote[os.path.relpath(obj["Key"], prefix)] = obj
+
+        downloaded = 0
+        for relative_path, obj in remote.items():
+            path = os.path.join(directory, relative_path)
+            if os.path.exists(path) and os.path.getsize(path) == obj["Size"]:
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Descarga a un temporal para que DuckDB nunca lea un archivo a medias
+            # (uno por proceso: varios workers pueden sincronizar el mismo directorio)
+            part = f"{path}.{os.getpid()}.part"
+            self.s3.download_file(bucket, obj["Key"], part)
+            os.replace(part, path)
+            downloaded += 1
+
+        for root, _, files in os.walk(directory):
+            for name in files:
+                if name.endswith(".part"):
+                    continue
+                path = os.path.join(root, name)
+                if os.path.relpath(path, directory) not in remote:
+                    os.remove(path)
+
+        return downloaded, sum(obj["Size"] for obj in remote.values())
+
+    def _load_table(self, table: str, directory: str):
+        """
+        Carga (o recarga) en una tabla DuckDB todas las particiones de la tabla
+
+        La nueva versión se construye aparte y se reemplaza bajo el lock: las
+        queries en curso terminan sobre la anterior.
+        """
+        pattern = os.path.join(directory, "**", "*.json").replace("'", "''")
+        staging = f"{table}__sync"
+        cursor = self._conn.cursor()
+        try:
+            cursor.execute(
+                f'CREATE OR REPLACE TABLE "{staging}" AS SELECT * FROM read_json_auto('
+                f"'{pattern}', format='newline_delimited', hive_partitioning=true, "
+                f"hive_types_autocast=false, union_by_name=true)"
+            )
+            with self._lock:
+                cursor.execute("BEGIN TRANSACTION")
+                cursor.execute(f'DROP TABLE IF EXISTS "{table}"')
+                cursor.execute(f'ALTER TABLE "{staging}" RENAME TO "{table}"')
+                cursor.execute("COMMIT")
+        finally:
+            cursor.close()
+
+    def _drop_table(self, table: str):
+        """Elimina la tabla cargada en DuckDB"""
+        with self._lock:
+            self._conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+        self._loaded_sizes.pop(table, None)
+
+    def _translate(self, name: str, statement: str) -> Tuple[str, List[str]]:
+        """Traduce el SQL de Athena (Presto) a DuckDB y obtiene sus tablas (cacheado por query)"""
+        if name not in self._statements:
+            tree = sqlglot.parse_one(statement, read="presto")
+            tables = sorted({table.name for table in tree.find_all(exp.Table)})
+            self._statements[name] = (tree.sql(dialect="duckdb"), tables)
+        return self._statements[name]
+
+    def can_execute(self, name: str, statement: str) -> bool:
+        """
+        Indica si una query puede resolverse localmente
+
+        Args:
+            name: Clave de la query en PREDEFINED_QUERIES
+            statement: SQL de la query (dialecto Athena)
+        """
+        if not self.available or (self.queries is not None and name not in self.queries):
+            return False
+
+        try:
+            _, tables = self._translate(name, statement)
+        except Exception as e:
+            logger.warning(f"Query {name} no es traducible a DuckDB: {e}")
+            return False
+
+        with self._lock:
+            sizes = [self.table_sizes.get(table, 0) for table in tables]
+        return all(0 < size <= self.max_table_bytes for size in sizes)
+
+    def execute(self, name: str, statement: str, parameters: Sequence = ()) -> Tuple[List[Dict[str, Any]], QueryStats]:
+        """
+        Ejecuta una query predefinida en DuckDB
+
+        Los valores se devuelven como texto, igual que los entrega Athena.
+
+        Args:
+            name: Clave de la query en PREDEFINED_QUERIES
+            statement: SQL de la query (dialecto Athena, con placeholders '?')
+            parameters: Valores en el orden de los placeholders
+
+        Returns:
+            Tupla (resultados, estadísticas)
+        """
+        start_time = time.time()
+        sql, _ = self._translate(name, statement)
+
+        with self._lock:
+            cursor = self._conn.cursor()
+        try:
+            cursor.execute(sql, list(parameters) or None)
+            columns = [column[0] for column in cursor.description]
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+
+        results = [dict(zip(columns, (_athena_text(value) for value in row))) for row in rows]
+        execution_time = int((time.time() - start_time) * 1000)
+        logger.info(f"Query {name} resuelta localmente en {execution_time}ms - {len(results)} filas")
+
+        return results, QueryStats(
+            query_execution_id="local",
+            execution_time_ms=execution_time,
+            engine="local"
+        )
+
+
+def _athena_text(value: Any) -> Optional[str]:
+    """Convierte un valor de DuckDB al texto que devolvería Athena (VarCharValue)"""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+def _directory_size(directory: str) -> int:
+    """Suma el tamaño de los archivos .json de un directorio local"""
+    total = 0
+    for root, _, files in os.walk(directory):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files if name.endswith(".json"))
+    return total
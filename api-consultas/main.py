@@ -3,17 +3,31 @@ API REST para Consultas Analíticas del DataLake
 Ejecuta queries en Athena y devuelve resultados en JSON
 """
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field, PrivateAttr
+from typing import Optional, List, Dict, Any, Callable, Tuple
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from functools import partial
+import asyncio
 import logging
+import time
 from datetime import datetime
 import os
 from dotenv import load_dotenv
 
-from athena_client import AthenaClient
-from queries import PREDEFINED_QUERIES
+from athena_client import AthenaClient, QueryStats
+from queries import PREDEFINED_QUERIES, query_parameters
+from fingerprint import normalize_query, query_fingerprint
+from metrics import (CONTENT_TYPE_LATEST, record_cache_lookup, record_custom_query_estimate,
+                     record_query_failure, record_query_stats, render_metrics)
+from query_guard import EstimateUnavailable, QueryGuard, QueryRejected, TableSizeEstimator
+from local_engine import DEFAULT_TABLE_SOURCES, LocalQueryEngine, parse_table_sources
+from result_cache import ResultCache, create_backend
+from serialization import CompressionMiddleware, FastJSONResponse, make_etag
+from scheduler import CacheWarmer, LivenessMonitor
 
 # Cargar variables de entorno
 load_dotenv()
@@ -26,11 +40,28 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+def getenv_or_default(name: str, default: str) -> str:
+    """Variable de entorno; vacía (p.ej. '${VAR:-}' en docker-compose) equivale a no definida"""
+    return os.getenv(name, "").strip() or default
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Inicia y detiene las tareas en segundo plano (cache warmer y liveness)"""
+    liveness_monitor.start()
+    cache_warmer.start()
+    yield
+    await cache_warmer.stop()
+    await liveness_monitor.stop()
+
+
 # Crear aplicación FastAPI
 app = FastAPI(
     title="DataLake Analytics API",
     description="API REST para consultas analíticas sobre el DataLake",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configurar CORS (para permitir acceso desde navegadores)
@@ -42,9 +73,67 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compresión negociada (zstd/gzip) de respuestas de al menos COMPRESSION_MIN_BYTES
+app.add_middleware(CompressionMiddleware, minimum_size=int(os.getenv("COMPRESSION_MIN_BYTES", "1024")))
+
 # Cliente de Athena
 athena_client = AthenaClient()
 
+# Límites del endpoint batch
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "10"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "5"))
+
+# Análisis de queries personalizadas (LIMIT por defecto y presupuesto de escaneo)
+query_guard = QueryGuard(
+    TableSizeEstimator(athena_client.glue, athena_client.s3,
+                       cache_ttl_seconds=int(os.getenv("SCAN_ESTIMATE_CACHE_SECONDS", "600"))),
+    default_limit=int(os.getenv("CUSTOM_QUERY_DEFAULT_LIMIT", "1000")),
+    scan_budget_bytes=int(os.getenv("CUSTOM_QUERY_SCAN_BUDGET_BYTES", str(1024 ** 3))),
+    fail_open=os.getenv("CUSTOM_QUERY_FAIL_OPEN", "true").lower() == "true"
+)
+
+# Motor local (DuckDB) para queries predefinidas sobre tablas pequeñas
+local_engine = None
+if os.getenv("LOCAL_ENGINE_ENABLED", "false").lower() == "true":
+    # Vacíos = las 9 tablas de DEFAULT_TABLE_SOURCES y todas las PREDEFINED_QUERIES
+    local_engine_queries = getenv_or_default("LOCAL_ENGINE_QUERIES", "")
+    local_engine = LocalQueryEngine(
+        sources=parse_table_sources(getenv_or_default("LOCAL_ENGINE_TABLES", DEFAULT_TABLE_SOURCES)),
+        cache_dir=os.getenv("LOCAL_ENGINE_CACHE_DIR", "data/lake"),
+        s3_client=athena_client.s3,
+        max_table_bytes=int(os.getenv("LOCAL_ENGINE_MAX_TABLE_BYTES", str(32 * 1024 ** 2))),
+        queries=[name.strip() for name in local_engine_queries.split(",") if name.strip()] or None
+    )
+
+# Cache de resultados (stale-while-revalidate), compartido entre workers con sqlite/redis
+result_cache = ResultCache(
+    ttl_seconds=int(os.getenv("CACHE_TTL_SECONDS", "300")),
+    stale_ttl_seconds=int(os.getenv("CACHE_STALE_TTL_SECONDS", "3600")),
+    backend=create_backend(
+        os.getenv("CACHE_BACKEND", "memory"),
+        max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "256")),
+        sqlite_path=os.getenv("CACHE_SQLITE_PATH", "data/result_cache.db"),
+        redis_url=os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+    ),
+    lock_ttl_seconds=int(os.getenv("CACHE_LOCK_TTL_SECONDS", "120"))
+)
+# La última ingesta (expire_all en refresh_cache) acota la reutilización de resultados en Athena
+# y deja fuera de uso la copia local hasta la siguiente sincronización
+athena_client.ingestion_watermark = result_cache.expired_at
+if local_engine:
+    local_engine.ingestion_watermark = result_cache.expired_at
+# Cada cuánto revisa un worker si terminó la ejecución que corre otro
+SHARED_POLL_INTERVAL_SECONDS = 0.25
+
+# Tareas en segundo plano
+CACHE_WARM_INTERVAL_SECONDS = int(os.getenv("CACHE_WARM_INTERVAL_SECONDS", "240"))
+# Vacío = todas las queries predefinidas; 'none' = no precalentar
+CACHE_WARM_QUERIES = [
+    name.strip() for name in getenv_or_default("CACHE_WARM_QUERIES", ",".join(PREDEFINED_QUERIES)).split(",")
+    if name.strip() in PREDEFINED_QUERIES
+]
+HEALTH_CHECK_INTERVAL_SECONDS = int(os.getenv("HEALTH_CHECK_INTERVAL_SECONDS", "30"))
+
 
 # Modelos Pydantic
 class CustomQueryRequest(BaseModel):
@@ -57,7 +146,320 @@ class QueryResponse(BaseModel):
     data: Optional[List[Dict[str, Any]]] = None
     rows_count: Optional[int] = None
     execution_time_ms: Optional[int] = None
+    data_scanned_bytes: Optional[int] = None
+    estimated_scan_bytes: Optional[int] = None
+    engine: Optional[str] = None
+    cached: Optional[bool] = None
+    cache_age_seconds: Optional[int] = None
     error: Optional[str] = None
+    # ETag del resultado cacheado (no se serializa)
+    _etag: Optional[str] = PrivateAttr(default=None)
+
+
+class BatchQueryItem(BaseModel):
+    query: str
+    # Se validan por query (query_parameters): un valor inválido solo falla su item
+    params: Dict[str, Any] = Field(default_factory=dict)
+
+
+class BatchQueryRequest(BaseModel):
+    queries: List[BatchQueryItem]
+
+
+class BatchQueryResult(QueryResponse):
+    query: str
+    params: Dict[str, Any] = Field(default_factory=dict)
+
+
+class BatchQueryResponse(BaseModel):
+    success: bool
+    results: List[BatchQueryResult]
+    succeeded: int
+    failed: int
+    total_time_ms: int
+
+
+# ========== EJECUCIÓN ==========
+
+def _build_response(results: List[Dict[str, Any]], stats: QueryStats, etag: Optional[str] = None,
+                    **extra) -> QueryResponse:
+    """
+    Arma la respuesta exitosa a partir de los resultados y sus estadísticas
+
+    Las filas vienen de Athena/DuckDB (dicts de texto): se construye sin
+    validar fila por fila con pydantic.
+    """
+    response = QueryResponse.model_construct(
+        success=True,
+        data=results,
+        rows_count=len(results) if results else 0,
+        execution_time_ms=stats.execution_time_ms,
+        data_scanned_bytes=stats.data_scanned_bytes,
+        engine=stats.engine,
+        **extra
+    )
+    response._etag = etag
+    return response
+
+
+def _respond(response: QueryResponse) -> FastJSONResponse:
+    """Serializa la respuesta con orjson (304 si el cliente ya tiene el mismo resultado)"""
+    return FastJSONResponse(response, etag=response._etag)
+
+
+async def _cache_call(method: Callable, *args):
+    """
+    Llama a un método de result_cache sin bloquear el event loop
+
+    Los backends sqlite y redis hacen I/O (y serializan a JSON): corren en un
+    thread. El backend en memoria solo toma un lock y se llama directo.
+    """
+    if result_cache.shared:
+        return await run_in_threadpool(method, *args)
+    return method(*args)
+
+
+async def _fetch_once(cache_key: str, query_key: str, endpoint: str, execute: Callable,
+                      force: bool = False) -> QueryResponse:
+    """
+    Ejecuta (en un thread), registra métricas y guarda el resultado en cache
+
+    Si otro worker ya tiene el lock de la clave, espera su ejecución en vez
+    de lanzar otra.
+
+    Args:
+        cache_key: Clave del resultado en result_cache
+        query_key: Clave para métricas (nombre en PREDEFINED_QUERIES, 'custom', ...)
+        endpoint: Ruta del endpoint que origina la ejecución
+        execute: Método *_with_stats (con sus argumentos) que acepta on_started
+        force: Ejecutar aunque otro worker tenga el lock (su ejecución puede ser anterior a la ingesta)
+
+    Returns:
+        QueryResponse con el tiempo de esta ejecución
+    """
+    owner = await _cache_call(result_cache.acquire, cache_key)
+    if owner is None and not force:
+        response = await _wait_for_owner(cache_key, query_key)
+        if response is not None:
+            return response
+        # El dueño terminó sin resultado o su lock venció: se ejecuta aquí
+        owner = await _cache_call(result_cache.acquire, cache_key)
+
+    # El lock se libera después de guardar el resultado, para que quien espera lo encuentre
+    started_at = time.time()
+    try:
+        try:
+            on_started = partial(result_cache.set_execution_id, cache_key, owner) if owner else None
+            results, stats = await run_in_threadpool(partial(execute, on_started=on_started))
+        except Exception as e:
+            logger.error(f"Error en {query_key}: {e}")
+            record_query_failure(query_key, endpoint)
+            return QueryResponse(success=False, error=str(e))
+
+        record_query_stats(query_key, endpoint, stats)
+        if started_at < await _cache_call(result_cache.expired_at):
+            # Empezó antes de la última ingesta: no reemplaza al resultado que se está refrescando
+            return _build_response(results, stats, cached=False)
+        stored_at = await _cache_call(result_cache.set, cache_key, {"results": results, "stats": asdict(stats)})
+    finally:
+        if owner:
+            await _cache_call(result_cache.release, cache_key, owner)
+
+    return _build_response(results, stats, etag=make_etag(cache_key, stored_at), cached=False)
+
+
+async def _wait_for_owner(cache_key: str, query_key: str) -> Optional[QueryResponse]:
+    """
+    Espera la ejecución que otro worker tiene en curso para la misma clave
+
+    Returns:
+        QueryResponse con el resultado compartido, o None si hay que ejecutar aquí
+    """
+    started_at = time.time()
+    deadline = started_at + result_cache.lock_ttl_seconds
+
+    while time.time() < deadline:
+        entry = await _cache_call(result_cache.get, cache_key)
+        if entry is not None and (entry.fresh or entry.stored_at >= started_at):
+            return _build_response(entry.value["results"], QueryStats(**entry.value["stats"]),
+                                   etag=make_etag(cache_key, entry.stored_at),
+                                   cached=True, cache_age_seconds=entry.age_seconds)
+
+        inflight = await _cache_call(result_cache.get_inflight, cache_key)
+        if inflight is None:
+            return None
+
+        _, execution_id = inflight
+        if execution_id:
+            # Se leen los resultados de la misma ejecución en Athena (no se vuelve a escanear)
+            try:
+                results, stats = await run_in_threadpool(athena_client.wait_for_execution_with_stats, execution_id)
+            except Exception as e:
+                logger.error(f"Error en {query_key} (ejecución {execution_id}): {e}")
+                return QueryResponse(success=False, error=str(e))
+            return _build_response(results, stats, cached=False)
+
+        await asyncio.sleep(SHARED_POLL_INTERVAL_SECONDS)
+
+    return None
+
+
+# Ejecuciones en curso en este proceso (requests concurrentes con la misma clave comparten una)
+_inflight: Dict[str, asyncio.Task] = {}
+
+
+def _fetch_task(cache_key: str, query_key: str, endpoint: str, execute: Callable,
+                force: bool = False) -> asyncio.Task:
+    """
+    Devuelve la ejecución en curso de la clave o inicia una nueva
+
+    Con force siempre inicia una nueva (la que está en curso puede haber
+    empezado antes de la ingesta) y las requests siguientes se unen a ella.
+    """
+    task = _inflight.get(cache_key)
+    if task is None or force:
+        task = asyncio.create_task(_fetch_once(cache_key, query_key, endpoint, execute, force=force))
+        _inflight[cache_key] = task
+
+        def forget(done: asyncio.Task):
+            # Una ejecución reemplazada por otra forzada no borra a la nueva
+            if _inflight.get(cache_key) is done:
+                del _inflight[cache_key]
+
+        task.add_done_callback(forget)
+    return task
+
+
+async def _fetch(cache_key: str, query_key: str, endpoint: str, execute: Callable,
+                 force: bool = False) -> QueryResponse:
+    """Ejecuta una sola vez por clave y devuelve una copia de la respuesta"""
+    # shield: si el cliente se desconecta, la ejecución compartida sigue
+    response = await asyncio.shield(_fetch_task(cache_key, query_key, endpoint, execute, force=force))
+    return response.model_copy()
+
+
+def _revalidate(cache_key: str, query_key: str, endpoint: str, execute: Callable):
+    """Refresca una entrada vencida en segundo plano"""
+    _fetch_task(cache_key, query_key, endpoint, execute)
+
+
+async def _execute(cache_key: str, query_key: str, endpoint: str, execute: Callable) -> QueryResponse:
+    """
+    Sirve desde cache si es posible (stale-while-revalidate) o ejecuta en Athena
+
+    Args:
+        cache_key: Clave del resultado en result_cache
+        query_key: Clave para métricas
+        endpoint: Ruta del endpoint que origina la ejecución
+        execute: Método *_with_stats (con sus argumentos) que acepta on_started
+    """
+    entry = await _cache_call(result_cache.get, cache_key)
+
+    if entry is None:
+        record_cache_lookup(query_key, "miss")
+        return await _fetch(cache_key, query_key, endpoint, execute)
+
+    if entry.fresh:
+        record_cache_lookup(query_key, "hit")
+    else:
+        record_cache_lookup(query_key, "stale")
+        _revalidate(cache_key, query_key, endpoint, execute)
+
+    return _build_response(entry.value["results"], QueryStats(**entry.value["stats"]),
+                           etag=make_etag(cache_key, entry.stored_at),
+                           cached=True, cache_age_seconds=entry.age_seconds)
+
+
+async def run_query(query: str, query_key: str, endpoint: str, database: Optional[str] = None) -> QueryResponse:
+    """
+    Ejecuta una query SQL libre (normalizada para reutilizar resultados en Athena)
+
+    Args:
+        query: Query SQL a ejecutar
+        query_key: Clave para métricas
+        endpoint: Ruta del endpoint que origina la ejecución
+        database: Base de datos (opcional)
+    """
+    query = normalize_query(query)
+    cache_key = f"{database or athena_client.database}:{query_fingerprint(query)}"
+
+    return await _execute(cache_key, query_key, endpoint,
+                          partial(athena_client.execute_query_with_stats, query, database))
+
+
+def _predefined_execution(query_name: str, params: Optional[Dict[str, Any]],
+                          reuse_results: bool = True) -> Tuple[str, Callable]:
+    """
+    Prepara la ejecución de una query de PREDEFINED_QUERIES: en el motor local
+    si es elegible, si no en Athena como prepared statement
+
+    Returns:
+        Tupla (clave de cache, llamada que acepta on_started y devuelve (resultados, estadísticas))
+
+    Raises:
+        KeyError, ValueError: Si la query o sus parámetros no son válidos
+    """
+    values = query_parameters(query_name, params)
+    statement = PREDEFINED_QUERIES[query_name]
+    cache_key = f"{athena_client.database}:{query_fingerprint(statement, values)}"
+    athena_execute = partial(athena_client.execute_statement_with_stats, query_name, statement, values,
+                             reuse_results=reuse_results)
+
+    if local_engine and local_engine.can_execute(query_name, statement):
+        return cache_key, partial(_execute_locally, query_name, statement, values, athena_execute)
+
+    return cache_key, athena_execute
+
+
+def _execute_locally(query_name: str, statement: str, values: List[int], athena_execute: Callable,
+                     on_started: Optional[Callable[[str], None]] = None):
+    """Ejecuta en el motor local y, si falla o su copia es anterior a la última ingesta, en Athena"""
+    if local_engine.is_outdated():
+        logger.info(f"Copia local anterior a la última ingesta, {query_name} va a Athena")
+        return athena_execute(on_started=on_started)
+    try:
+        return local_engine.execute(query_name, statement, values)
+    except Exception as e:
+        logger.warning(f"Motor local falló para {query_name}, usando Athena: {e}")
+        return athena_execute(on_started=on_started)
+
+
+async def run_predefined_query(query_name: str, endpoint: str, params: Optional[Dict[str, Any]] = None) -> QueryResponse:
+    """
+    Ejecuta (o sirve desde cache) una query de PREDEFINED_QUERIES
+
+    Args:
+        query_name: Clave en PREDEFINED_QUERIES
+        endpoint: Ruta del endpoint que origina la ejecución
+        params: Parámetros de la query (ver QUERY_PARAMETERS)
+    """
+    try:
+        cache_key, execute = _predefined_execution(query_name, params)
+    except (KeyError, ValueError) as e:
+        return QueryResponse(success=False, error=e.args[0])
+
+    return await _execute(cache_key, query_name, endpoint, execute)
+
+
+async def refresh_predefined_query(query_name: str, force: bool = False) -> bool:
+    """
+    Ejecuta una query predefinida (con parámetros por defecto) y actualiza el cache
+
+    Args:
+        query_name: Clave en PREDEFINED_QUERIES
+        force: No reutilizar resultados previos (tras una nueva ingesta)
+
+    Returns:
+        True si la ejecución fue exitosa
+    """
+    cache_key, execute = _predefined_execution(query_name, None, reuse_results=not force)
+    response = await _fetch(cache_key, query_name, "scheduler", execute, force=force)
+    return response.success
+
+
+cache_warmer = CacheWarmer(CACHE_WARM_QUERIES, CACHE_WARM_INTERVAL_SECONDS, refresh_predefined_query,
+                           sync=local_engine.sync if local_engine else None)
+liveness_monitor = LivenessMonitor(athena_client.check_connection, HEALTH_CHECK_INTERVAL_SECONDS)
 
 
 # ========== ENDPOINTS ==========
@@ -75,94 +477,55 @@ async def root():
 
 @app.get("/health", tags=["Health"])
 async def health_check():
-    """Health check del servicio"""
-    try:
-        # Verificar conexión con Athena
-        test_query = "SELECT 1 as test"
-        result = athena_client.execute_query(test_query)
-        
-        return {
-            "status": "healthy",
-            "athena_connection": "ok" if result else "error",
-            "timestamp": datetime.now().isoformat()
-        }
-    except Exception as e:
-        logger.error(f"Health check failed: {e}")
+    """Health check del servicio (usa el último estado de Athena verificado en segundo plano)"""
+    # Solo se verifica en línea si el monitor no tiene un estado reciente
+    if liveness_monitor.is_stale:
+        await liveness_monitor.refresh()
+
+    if not liveness_monitor.healthy:
+        logger.error(f"Health check failed: {liveness_monitor.error}")
         raise HTTPException(status_code=503, detail="Service unhealthy")
 
+    return {
+        "status": "healthy",
+        "athena_connection": "ok",
+        "checked_at": datetime.fromtimestamp(liveness_monitor.checked_at).isoformat(),
+        "cache_warmed_at": (datetime.fromtimestamp(cache_warmer.last_run_at).isoformat()
+                            if cache_warmer.last_run_at else None),
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+@app.get("/metrics", tags=["Health"])
+async def metrics():
+    """Métricas de latencia y bytes escaneados en formato Prometheus"""
+    return Response(content=render_metrics(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
 
 # ========== VENTAS (MySQL) ==========
 
 @app.get("/api/ventas/resumen", tags=["Ventas"], response_model=QueryResponse)
 async def get_ventas_resumen():
     """Obtener resumen general de ventas"""
-    try:
-        query = PREDEFINED_QUERIES["ventas_resumen"]
-        results = athena_client.execute_query(query)
-        
-        return QueryResponse(
-            success=True,
-            data=results,
-            rows_count=len(results) if results else 0,
-            execution_time_ms=athena_client.last_execution_time_ms
-        )
-    except Exception as e:
-        logger.error(f"Error en ventas_resumen: {e}")
-        return QueryResponse(success=False, error=str(e))
+    return _respond(await run_predefined_query("ventas_resumen", "/api/ventas/resumen"))
 
 
 @app.get("/api/ventas/por-usuario", tags=["Ventas"], response_model=QueryResponse)
 async def get_ventas_por_usuario():
     """Obtener ventas agrupadas por usuario"""
-    try:
-        query = PREDEFINED_QUERIES["ventas_por_usuario"]
-        results = athena_client.execute_query(query)
-        
-        return QueryResponse(
-            success=True,
-            data=results,
-            rows_count=len(results) if results else 0,
-            execution_time_ms=athena_client.last_execution_time_ms
-        )
-    except Exception as e:
-        logger.error(f"Error en ventas_por_usuario: {e}")
-        return QueryResponse(success=False, error=str(e))
+    return _respond(await run_predefined_query("ventas_por_usuario", "/api/ventas/por-usuario"))
 
 
 @app.get("/api/ventas/por-estado", tags=["Ventas"], response_model=QueryResponse)
 async def get_ventas_por_estado():
     """Obtener ventas agrupadas por estado de orden"""
-    try:
-        query = PREDEFINED_QUERIES["ordenes_por_estado"]
-        results = athena_client.execute_query(query)
-        
-        return QueryResponse(
-            success=True,
-            data=results,
-            rows_count=len(results) if results else 0,
-            execution_time_ms=athena_client.last_execution_time_ms
-        )
-    except Exception as e:
-        logger.error(f"Error en ventas_por_estado: {e}")
-        return QueryResponse(success=False, error=str(e))
+    return _respond(await run_predefined_query("ordenes_por_estado", "/api/ventas/por-estado"))
 
 
 @app.get("/api/productos/top", tags=["Productos"], response_model=QueryResponse)
 async def get_top_productos(limit: int = Query(10, ge=1, le=100)):
     """Obtener productos más valiosos por inventario"""
-    try:
-        query = PREDEFINED_QUERIES["productos_top"].format(limit=limit)
-        results = athena_client.execute_query(query)
-        
-        return QueryResponse(
-            success=True,
-            data=results,
-            rows_count=len(results) if results else 0,
-            execution_time_ms=athena_client.last_execution_time_ms
-        )
-    except Exception as e:
-        logger.error(f"Error en productos_top: {e}")
-        return QueryResponse(success=False, error=str(e))
+    return _respond(await run_predefined_query("productos_top", "/api/productos/top", {"limit": limit}))
 
 
 # ========== CLIENTES B2B (PostgreSQL) ==========
@@ -170,37 +533,13 @@ async def get_top_productos(limit: int = Query(10, ge=1, le=100)):
 @app.get("/api/clientes/top", tags=["Clientes B2B"], response_model=QueryResponse)
 async def get_top_clientes(limit: int = Query(10, ge=1, le=100)):
     """Obtener top clientes por facturación"""
-    try:
-        query = PREDEFINED_QUERIES["clientes_top"].format(limit=limit)
-        results = athena_client.execute_query(query)
-        
-        return QueryResponse(
-            success=True,
-            data=results,
-            rows_count=len(results) if results else 0,
-            execution_time_ms=athena_client.last_execution_time_ms
-        )
-    except Exception as e:
-        logger.error(f"Error en clientes_top: {e}")
-        return QueryResponse(success=False, error=str(e))
+    return _respond(await run_predefined_query("clientes_top", "/api/clientes/top", {"limit": limit}))
 
 
 @app.get("/api/facturas/estado", tags=["Clientes B2B"], response_model=QueryResponse)
 async def get_estado_facturas():
     """Obtener estado de facturas y pagos"""
-    try:
-        query = PREDEFINED_QUERIES["facturas_estado"]
-        results = athena_client.execute_query(query)
-        
-        return QueryResponse(
-            success=True,
-            data=results,
-            rows_count=len(results) if results else 0,
-            execution_time_ms=athena_client.last_execution_time_ms
-        )
-    except Exception as e:
-        logger.error(f"Error en facturas_estado: {e}")
-        return QueryResponse(success=False, error=str(e))
+    return _respond(await run_predefined_query("facturas_estado", "/api/facturas/estado"))
 
 
 # ========== INVENTARIO (MongoDB) ==========
@@ -208,37 +547,13 @@ async def get_estado_facturas():
 @app.get("/api/inventario/bajo-stock", tags=["Inventario"], response_model=QueryResponse)
 async def get_inventario_bajo_stock(threshold: int = Query(100, ge=1)):
     """Obtener productos con stock bajo el umbral especificado"""
-    try:
-        query = PREDEFINED_QUERIES["inventario_bajo_stock"].format(threshold=threshold)
-        results = athena_client.execute_query(query)
-        
-        return QueryResponse(
-            success=True,
-            data=results,
-            rows_count=len(results) if results else 0,
-            execution_time_ms=athena_client.last_execution_time_ms
-        )
-    except Exception as e:
-        logger.error(f"Error en inventario_bajo_stock: {e}")
-        return QueryResponse(success=False, error=str(e))
+    return _respond(await run_predefined_query("inventario_bajo_stock", "/api/inventario/bajo-stock", {"threshold": threshold}))
 
 
 @app.get("/api/envios/estado", tags=["Logística"], response_model=QueryResponse)
 async def get_estado_envios():
     """Obtener resumen de estado de envíos"""
-    try:
-        query = PREDEFINED_QUERIES["envios_estado"]
-        results = athena_client.execute_query(query)
-        
-        return QueryResponse(
-            success=True,
-            data=results,
-            rows_count=len(results) if results else 0,
-            execution_time_ms=athena_client.last_execution_time_ms
-        )
-    except Exception as e:
-        logger.error(f"Error en envios_estado: {e}")
-        return QueryResponse(success=False, error=str(e))
+    return _respond(await run_predefined_query("envios_estado", "/api/envios/estado"))
 
 
 # ========== DASHBOARD EJECUTIVO ==========
@@ -246,19 +561,7 @@ async def get_estado_envios():
 @app.get("/api/dashboard", tags=["Dashboard"], response_model=QueryResponse)
 async def get_dashboard():
     """Obtener métricas para dashboard ejecutivo"""
-    try:
-        query = PREDEFINED_QUERIES["dashboard_ejecutivo"]
-        results = athena_client.execute_query(query)
-        
-        return QueryResponse(
-            success=True,
-            data=results,
-            rows_count=len(results) if results else 0,
-            execution_time_ms=athena_client.last_execution_time_ms
-        )
-    except Exception as e:
-        logger.error(f"Error en dashboard: {e}")
-        return QueryResponse(success=False, error=str(e))
+    return _respond(await run_predefined_query("dashboard_ejecutivo", "/api/dashboard"))
 
 
 # ========== QUERY PERSONALIZADA ==========
@@ -266,31 +569,83 @@ async def get_dashboard():
 @app.post("/api/query/custom", tags=["Custom"], response_model=QueryResponse)
 async def execute_custom_query(request: CustomQueryRequest):
     """Ejecutar una query SQL personalizada en Athena"""
+    # Parsear (solo un SELECT), reescribir (LIMIT, filtros de partición) y estimar el escaneo antes de ir a Athena
     try:
-        # Validación básica de seguridad
-        forbidden_keywords = ["DROP", "DELETE", "TRUNCATE", "ALTER", "CREATE", "INSERT", "UPDATE"]
-        query_upper = request.query.upper()
-        
-        for keyword in forbidden_keywords:
-            if keyword in query_upper:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Keyword '{keyword}' no permitido. Solo queries de lectura (SELECT)"
-                )
-        
-        results = athena_client.execute_query(request.query, request.database)
-        
-        return QueryResponse(
-            success=True,
-            data=results,
-            rows_count=len(results) if results else 0,
-            execution_time_ms=athena_client.last_execution_time_ms
+        analysis = await run_in_threadpool(query_guard.analyze, request.query, request.database)
+    except QueryRejected as e:
+        record_custom_query_estimate(e.estimated_scan_bytes, rejected=True)
+        raise HTTPException(status_code=400, detail=str(e))
+    except EstimateUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    record_custom_query_estimate(analysis.estimated_scan_bytes)
+    
+    response = await run_query(analysis.query, "custom", "/api/query/custom", request.database)
+    response.estimated_scan_bytes = analysis.estimated_scan_bytes
+    return _respond(response)
+
+
+# ========== BATCH (múltiples queries en paralelo) ==========
+
+async def _run_batch_item(item: BatchQueryItem, semaphore: asyncio.Semaphore) -> BatchQueryResult:
+    """
+    Ejecuta una query del batch sin bloquear el event loop
+
+    Args:
+        item: Query predefinida y sus parámetros
+        semaphore: Limita las ejecuciones simultáneas contra Athena
+
+    Returns:
+        Resultado individual (los errores se reportan, no se propagan)
+    """
+    async with semaphore:
+        response = await run_predefined_query(item.query, "/api/batch", item.params)
+
+    return BatchQueryResult.model_construct(query=item.query, params=item.params, **dict(response))
+
+
+@app.post("/api/batch", tags=["Batch"], response_model=BatchQueryResponse)
+async def execute_batch(request: BatchQueryRequest):
+    """Ejecutar varias queries predefinidas en paralelo y devolverlas en una sola respuesta"""
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="Debe enviar al menos una query")
+
+    if len(request.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Máximo {BATCH_MAX_QUERIES} queries por batch"
         )
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error en custom query: {e}")
-        return QueryResponse(success=False, error=str(e))
+
+    start_time = time.time()
+    semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+    results = await asyncio.gather(*[_run_batch_item(item, semaphore) for item in request.queries])
+    failed = sum(1 for result in results if not result.success)
+
+    return FastJSONResponse(BatchQueryResponse.model_construct(
+        success=failed == 0,
+        results=results,
+        succeeded=len(results) - failed,
+        failed=failed,
+        total_time_ms=int((time.time() - start_time) * 1000)
+    ))
+
+
+# ========== CACHE ==========
+
+@app.post("/api/cache/refresh", tags=["Cache"])
+async def refresh_cache():
+    """Refrescar el cache tras una nueva ingesta (lo llama el ingester al terminar)"""
+    # Los resultados previos ya no reflejan el DataLake: se sirven mientras se revalidan
+    await _cache_call(result_cache.expire_all)
+    if athena_client.result_registry:
+        await run_in_threadpool(athena_client.result_registry.clear)
+
+    cache_warmer.trigger(force=True)
+
+    return {
+        "status": "scheduled",
+        "queries": cache_warmer.queries,
+        "timestamp": datetime.now().isoformat()
+    }
 
 
 # ========== LISTAR QUERIES DISPONIBLES ==========
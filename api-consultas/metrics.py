@@ -0,0 +1,143 @@
+"""
+Métricas Prometheus de latencia y costo de Athena
+"""
+
+import os
+from typing import Optional
+
+# prometheus_client activa el modo multiproceso al importarse si la variable existe,
+# aunque esté vacía: vacía se trata como no definida y el modo se decide una sola vez aquí
+if not os.environ.get("PROMETHEUS_MULTIPROC_DIR", "").strip():
+    os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+from prometheus_client import (CollectorRegistry, Counter, Histogram, CONTENT_TYPE_LATEST,
+                               generate_latest, multiprocess)
+
+from athena_client import QueryStats
+
+# Buckets en segundos: Athena rara vez baja de 0.1s y puede superar el minuto
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+
+LABELS = ["query_key", "endpoint"]
+
+QUERY_DURATION = Histogram(
+    "athena_query_duration_seconds",
+    "Tiempo total visto por la API (start + poll + fetch)",
+    LABELS, buckets=LATENCY_BUCKETS
+)
+QUEUE_TIME = Histogram(
+    "athena_query_queue_seconds",
+    "Tiempo en cola de Athena (QueryQueueTimeInMillis)",
+    LABELS, buckets=LATENCY_BUCKETS
+)
+PLANNING_TIME = Histogram(
+    "athena_query_planning_seconds",
+    "Tiempo de planificación (QueryPlanningTimeInMillis)",
+    LABELS, buckets=LATENCY_BUCKETS
+)
+ENGINE_TIME = Histogram(
+    "athena_query_engine_seconds",
+    "Tiempo de ejecución en el motor (EngineExecutionTimeInMillis)",
+    LABELS, buckets=LATENCY_BUCKETS
+)
+SERVICE_TIME = Histogram(
+    "athena_query_service_seconds",
+    "Tiempo de pre y post procesamiento del servicio",
+    LABELS, buckets=LATENCY_BUCKETS
+)
+DATA_SCANNED = Counter(
+    "athena_data_scanned_bytes",
+    "Bytes escaneados en Athena (base del costo: USD 5 por TB)",
+    LABELS
+)
+QUERIES = Counter(
+    "athena_queries",
+    "Queries ejecutadas por resultado",
+    LABELS + ["status"]
+)
+REUSED_RESULTS = Counter(
+    "athena_reused_results",
+    "Ejecuciones resueltas reutilizando un resultado previo de Athena",
+    LABELS
+)
+
+LOCAL_QUERY_DURATION = Histogram(
+    "local_query_duration_seconds",
+    "Tiempo de queries resueltas por el motor local (DuckDB)",
+    LABELS, buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 5)
+)
+LOCAL_QUERIES = Counter(
+    "local_queries",
+    "Queries resueltas por el motor local (DuckDB)",
+    LABELS
+)
+CACHE_REQUESTS = Counter(
+    "api_cache_requests",
+    "Lecturas del cache de resultados (hit, stale, miss)",
+    ["query_key", "result"]
+)
+
+CUSTOM_QUERIES_REJECTED = Counter(
+    "api_custom_queries_rejected",
+    "Queries personalizadas rechazadas antes de llegar a Athena"
+)
+CUSTOM_QUERY_ESTIMATED_BYTES = Histogram(
+    "api_custom_query_estimated_scan_bytes",
+    "Bytes a escanear estimados para queries personalizadas",
+    buckets=(1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9, 1e10, 1e11)
+)
+
+
+def record_query_stats(query_key: str, endpoint: str, stats: QueryStats):
+    """
+    Registra las estadísticas de una ejecución exitosa
+
+    Args:
+        query_key: Clave de la query (PREDEFINED_QUERIES, 'custom', 'health')
+        endpoint: Ruta del endpoint que originó la ejecución
+        stats: Estadísticas devueltas por AthenaClient (o por el motor local)
+    """
+    labels = (query_key, endpoint)
+    if stats.engine == "local":
+        LOCAL_QUERY_DURATION.labels(*labels).observe(stats.execution_time_ms / 1000)
+        LOCAL_QUERIES.labels(*labels).inc()
+        return
+
+    QUERY_DURATION.labels(*labels).observe(stats.execution_time_ms / 1000)
+    QUEUE_TIME.labels(*labels).observe(stats.queue_time_ms / 1000)
+    PLANNING_TIME.labels(*labels).observe(stats.planning_time_ms / 1000)
+    ENGINE_TIME.labels(*labels).observe(stats.engine_time_ms / 1000)
+    SERVICE_TIME.labels(*labels).observe(stats.service_time_ms / 1000)
+    DATA_SCANNED.labels(*labels).inc(stats.data_scanned_bytes)
+    QUERIES.labels(*labels, "success").inc()
+    if stats.reused_result:
+        REUSED_RESULTS.labels(*labels).inc()
+
+
+def record_query_failure(query_key: str, endpoint: str):
+    """Registra una ejecución fallida"""
+    QUERIES.labels(query_key, endpoint, "error").inc()
+
+
+def record_cache_lookup(query_key: str, result: str):
+    """Registra una lectura del cache ('hit', 'stale' o 'miss')"""
+    CACHE_REQUESTS.labels(query_key, result).inc()
+
+
+def record_custom_query_estimate(estimated_bytes: Optional[int], rejected: bool = False):
+    """Registra la estimación de escaneo de una query personalizada y si fue rechazada"""
+    if estimated_bytes is not None:
+        CUSTOM_QUERY_ESTIMATED_BYTES.observe(estimated_bytes)
+    if rejected:
+        CUSTOM_QUERIES_REJECTED.inc()
+
+
+def render_metrics() -> bytes:
+    """Serializa todas las métricas en formato texto de Prometheus"""
+    # Con varios workers cada proceso escribe en PROMETHEUS_MULTIPROC_DIR y se agregan al leer
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
@@ -1,7 +1,12 @@
 """
 Queries SQL predefinidas para el API
+
+Los parámetros se escriben como '?' para que cada query se registre una sola
+vez como prepared statement en Athena (EXECUTE ... USING) sin importar sus valores.
 """
 
+from typing import Any, Dict, List, Optional
+
 PREDEFINED_QUERIES = {
     # ========== VENTAS (MySQL) ==========
     "ventas_resumen": """
@@ -48,7 +53,7 @@ PREDEFINED_QUERIES = {
         FROM mysql_ms1_products
         WHERE stock > 0
         ORDER BY valor_inventario DESC
-        LIMIT {limit}
+        LIMIT ?
     """,
     
     # ========== CLIENTES B2B (PostgreSQL) ==========
@@ -63,7 +68,7 @@ PREDEFINED_QUERIES = {
         LEFT JOIN postgres_ms2_invoices i ON c.id = i.customer_id
         GROUP BY c.name, c.country, c.email
         ORDER BY facturacion_total DESC
-        LIMIT {limit}
+        LIMIT ?
     """,
     
     "facturas_estado": """
@@ -90,7 +95,7 @@ PREDEFINED_QUERIES = {
             warehouse_location,
             supplier
         FROM mongo_ms3_inventory
-        WHERE CAST(quantity AS INTEGER) < {threshold}
+        WHERE CAST(quantity AS INTEGER) < ?
         ORDER BY CAST(quantity AS INTEGER) ASC
     """,
     
@@ -152,4 +157,63 @@ PREDEFINED_QUERIES = {
             'inventory' as fuente
         FROM mongo_ms3_inventory
     """
-}
\ No newline at end of file
+}
+
+# Parámetros admitidos por las queries parametrizadas (default y rango válido),
+# en el mismo orden que sus placeholders '?'
+QUERY_PARAMETERS = {
+    "productos_top": {
+        "limit": {"default": 10, "min": 1, "max": 100},
+    },
+    "clientes_top": {
+        "limit": {"default": 10, "min": 1, "max": 100},
+    },
+    "inventario_bajo_stock": {
+        "threshold": {"default": 100, "min": 1, "max": None},
+    },
+}
+
+
+def query_parameters(query_name: str, params: Optional[Dict[str, Any]] = None) -> List[int]:
+    """
+    Valida los parámetros de una query predefinida
+
+    Args:
+        query_name: Clave en PREDEFINED_QUERIES
+        params: Valores de los parámetros (se usan los defaults si faltan)
+
+    Returns:
+        Valores en el orden de los placeholders '?' de la query
+
+    Raises:
+        KeyError: Si la query no existe
+        ValueError: Si algún parámetro es desconocido o está fuera de rango
+    """
+    if query_name not in PREDEFINED_QUERIES:
+        raise KeyError(f"Query '{query_name}' no existe")
+
+    params = params or {}
+    spec = QUERY_PARAMETERS.get(query_name, {})
+
+    unknown = set(params) - set(spec)
+    if unknown:
+        raise ValueError(f"Parámetros no soportados para '{query_name}': {', '.join(sorted(unknown))}")
+
+    values = []
+    for name, rules in spec.items():
+        value = params.get(name, rules["default"])
+        # int() aceptaría True y truncaría 5.7: solo enteros (o texto/float con valor entero)
+        if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+            raise ValueError(f"Parámetro '{name}' debe ser entero")
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Parámetro '{name}' debe ser entero")
+        if rules["min"] is not None and value < rules["min"]:
+            raise ValueError(f"Parámetro '{name}' debe ser >= {rules['min']}")
+        if rules["max"] is not None and value > rules["max"]:
+            raise ValueError(f"Parámetro '{name}' debe ser <= {rules['max']}")
+        values.append(value)
+
+    return values
+
@@ -0,0 +1,454 @@
+"""
+Análisis de queries personalizadas antes de enviarlas a Athena
+
+Parsea el SQL, agrega un LIMIT por defecto, empuja los filtros de partición
+(year/month/day) hacia las tablas cuando es posible y estima los bytes a
+escanear con los metadatos de Glue y S3. Las queries que superan el
+presupuesto de escaneo se rechazan sin llegar a Athena.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import sqlglot
+from sqlglot import exp
+from sqlglot.errors import ParseError
+from sqlglot.optimizer.pushdown_predicates import pushdown_predicates
+from sqlglot.optimizer.qualify import qualify
+from sqlglot.optimizer.scope import traverse_scope
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+# Dialecto de Athena (motor v3 basado en Trino/Presto)
+DIALECT = "presto"
+
+
+class QueryRejected(Exception):
+    """La query no puede enviarse a Athena (no es de lectura o supera el presupuesto)"""
+
+    def __init__(self, message: str, estimated_scan_bytes: Optional[int] = None):
+        super().__init__(message)
+        self.estimated_scan_bytes = estimated_scan_bytes
+
+
+class EstimateUnavailable(Exception):
+    """No se pudieron leer los metadatos de Glue/S3 para estimar el escaneo (con fail_open=False)"""
+
+
+@dataclass
+class QueryAnalysis:
+    """Resultado del análisis de una query personalizada"""
+    query: str
+    tables: List[str]
+    estimated_scan_bytes: Optional[int]
+    limit_injected: bool = False
+    predicates_pushed: bool = False
+    # Una entrada por referencia a una tabla: ('database.tabla', filtro de Glue o None)
+    partition_filters: List[Tuple[str, Optional[str]]] = field(default_factory=list)
+
+
+class TableSizeEstimator:
+    """Estima el tamaño de tablas y particiones a partir de Glue y S3"""
+
+    def __init__(self, glue_client, s3_client, cache_ttl_seconds: int = 600, max_entries: int = 1024):
+        """
+        Inicializa el estimador
+
+        Args:
+            glue_client: Cliente boto3 de Glue
+            s3_client: Cliente boto3 de S3
+            cache_ttl_seconds: Segundos que se reutilizan metadatos y tamaños
+            max_entries: Cantidad máxima de entradas cacheadas (se descartan las menos usadas)
+        """
+        self.glue = glue_client
+        self.s3 = s3_client
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.max_entries = max_entries
+        # Las claves incluyen filtros escritos por el usuario: el cache tiene que estar acotado
+        self._cache: "OrderedDict[Tuple, Tuple[float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, key: Tuple, loader):
+        """Devuelve el valor cacheado para key o lo calcula con loader()"""
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry and time.time() - entry[0] < self.cache_ttl_seconds:
+                self._cache.move_to_end(key)
+                return entry[1]
+
+        value = loader()
+        with self._lock:
+            self._cache[key] = (time.time(), value)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return value
+
+    def get_table(self, database: str, table: str) -> Optional[dict]:
+        """
+        Obtiene la definición de una tabla del Glue Data Catalog
+
+        Returns:
+            Campo 'Table' de glue.get_table o None si no existe
+        """
+        def load():
+            try:
+                return self.glue.get_table(DatabaseName=database, Name=table)['Table']
+            except ClientError as e:
+                if e.response['Error']['Code'] == 'EntityNotFoundException':
+                    return None
+                raise
+
+        return self._cached(("table", database, table), load)
+
+    def get_schema(self, database: str, table: str) -> Optional[Dict[str, str]]:
+        """Columnas (incluidas las de partición) de una tabla, para calificar la query"""
+        definition = self.get_table(database, table)
+        if not definition:
+            return None
+
+        columns = definition.get('StorageDescriptor', {}).get('Columns', []) + definition.get('PartitionKeys', [])
+        # Solo importan los nombres: el tipo no cambia la calificación de columnas
+        return {column['Name']: "varchar" for column in columns}
+
+    def get_partition_keys(self, database: str, table: str) -> List[str]:
+        """Nombres de las columnas de partición de una tabla"""
+        definition = self.get_table(database, table)
+        return [key['Name'] for key in definition.get('PartitionKeys', [])] if definition else []
+
+    def estimate(self, database: str, table: str, partition_filter: Optional[str] = None) -> Optional[int]:
+        """
+        Estima los bytes que Athena escanearía de una tabla
+
+        JSON Lines no permite leer columnas por separado, así que se cuenta el
+        tamaño completo de los objetos de las particiones seleccionadas.
+
+        Args:
+            database: Base de datos en Glue
+            table: Nombre de la tabla
+            partition_filter: Expresión de Glue sobre las columnas de partición (opcional)
+
+        Returns:
+            Bytes estimados o None si la tabla no está catalogada
+        """
+        definition = self.get_table(database, table)
+        if not definition:
+            return None
+
+        if not partition_filter or not definition.get('PartitionKeys'):
+            return self._cached(("size", database, table), lambda: self._location_size(definition))
+
+        return self._cached(
+            ("size", database, table, partition_filter),
+            lambda: self._partitions_size(database, table, partition_filter, definition)
+        )
+
+    def _partitions_size(self, database: str, table: str, partition_filter: str, definition: dict) -> int:
+        """Suma el tamaño de las particiones que cumplen el filtro"""
+        try:
+            paginator = self.glue.get_paginator('get_partitions')
+            total = 0
+            for page in paginator.paginate(DatabaseName=database, TableName=table, Expression=partition_filter):
+                for partition in page['Partitions']:
+                    total += self._location_size(partition)
+            return total
+        except ClientError as e:
+            # Glue no acepta algunas expresiones: se estima la tabla completa
+            logger.warning(f"No se pudo filtrar particiones de {table} ({partition_filter}): {e}")
+            return self._location_size(definition)
+
+    def _location_size(self, definition: dict) -> int:
+        """Tamaño de una tabla o partición: estadística del crawler o listado de S3"""
+        size_key = definition.get('Parameters', {}).get('sizeKey')
+        if size_key:
+            return int(size_key)
+
+        location = definition.get('StorageDescriptor', {}).get('Location', '')
+        if not location.startswith('s3://'):
+            return 0
+
+        bucket, _, prefix = location[len('s3://'):].partition('/')
+        total = 0
+        paginator = self.s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            total += sum(obj['Size'] for obj in page.get('Contents', []))
+        return total
+
+
+class QueryGuard:
+    """Valida, reescribe y estima el costo de queries personalizadas"""
+
+    def __init__(self, estimator: TableSizeEstimator, default_limit: int, scan_budget_bytes: int,
+                 fail_open: bool = True):
+        """
+        Inicializa el guard
+
+        Args:
+            estimator: Estimador de tamaños de tablas
+            default_limit: LIMIT que se agrega si la query no tiene (0 = no agregar)
+            scan_budget_bytes: Máximo de bytes estimados permitido (0 = sin límite)
+            fail_open: Si Glue/S3 fallan, ejecutar sin estimación (False = rechazar la query)
+        """
+        self.estimator = estimator
+        self.default_limit = default_limit
+        self.scan_budget_bytes = scan_budget_bytes
+        self.fail_open = fail_open
+
+    def analyze(self, query: str, database: str) -> QueryAnalysis:
+        """
+        Analiza una query personalizada
+
+        Args:
+            query: Query SQL enviada por el usuario
+            database: Base de datos en la que se ejecutará
+
+        Returns:
+            QueryAnalysis con la query reescrita y los bytes estimados
+
+        Raises:
+            QueryRejected: Si no es una única query SELECT o supera el presupuesto
+            EstimateUnavailable: Si fallan Glue/S3 y fail_open es False
+        """
+        tree = self._parse(query)
+        analysis = QueryAnalysis(query=query, tables=[], estimated_scan_bytes=None)
+
+        tables = self._base_tables(tree)
+        analysis.tables = sorted({name for _, name in tables})
+
+        # El parseo y el LIMIT no dependen de los metadatos: se aplican aunque Glue/S3 fallen
+        try:
+            tree = self._push_predicates(tree, database, tables, analysis)
+            analysis.estimated_scan_bytes = self._estimate(analysis.partition_filters)
+        except Exception as e:
+            if not self.fail_open:
+                raise EstimateUnavailable(f"No se pudo estimar el escaneo de la query: {e}") from e
+            logger.warning(f"No se pudo estimar el escaneo, se ejecuta sin presupuesto: {e}")
+            analysis.estimated_scan_bytes = None
+
+        if self.default_limit > 0 and not tree.args.get('limit'):
+            tree = tree.limit(self.default_limit)
+            analysis.limit_injected = True
+
+        analysis.query = tree.sql(dialect=DIALECT) if (analysis.limit_injected or analysis.predicates_pushed) else query
+
+        if (self.scan_budget_bytes > 0 and analysis.estimated_scan_bytes is not None
+                and analysis.estimated_scan_bytes > self.scan_budget_bytes):
+            raise QueryRejected(
+                f"La query escanearía ~{analysis.estimated_scan_bytes} bytes y el máximo permitido es "
+                f"{self.scan_budget_bytes}. Filtra por partición (year/month/day) o por menos tablas",
+                analysis.estimated_scan_bytes
+            )
+
+        logger.info(
+            f"Query personalizada analizada - tablas: {analysis.tables}, "
+            f"~{analysis.estimated_scan_bytes} bytes, LIMIT agregado: {analysis.limit_injected}, "
+            f"predicados empujados: {analysis.predicates_pushed}"
+        )
+        return analysis
+
+    def _parse(self, query: str) -> exp.Expression:
+        """Parsea la query y verifica que sea una única consulta de lectura"""
+        try:
+            statements = [statement for statement in sqlglot.parse(query, read=DIALECT) if statement]
+        except ParseError as e:
+            raise QueryRejected(f"Query inválida: {e}")
+
+        if len(statements) != 1:
+            raise QueryRejected("Solo se permite una query por request")
+
+        tree = statements[0]
+        if not isinstance(tree, (exp.Select, exp.Union)):
+            raise QueryRejected("Solo queries de lectura (SELECT)")
+
+        return tree
+
+    def _base_tables(self, tree: exp.Expression) -> List[Tuple[str, str]]:
+        """Tablas del DataLake referenciadas (sin contar CTEs), como (database, tabla)"""
+        cte_names = {cte.alias_or_name for cte in tree.find_all(exp.CTE)}
+        return [
+            (table.db, table.name) for table in tree.find_all(exp.Table)
+            if table.name and (table.db or table.name not in cte_names)
+        ]
+
+    def _push_predicates(self, tree: exp.Expression, database: str, tables: List[Tuple[str, str]],
+                         analysis: QueryAnalysis) -> exp.Expression:
+        """
+        Empuja los filtros hacia las tablas y completa analysis.partition_filters
+
+        Returns:
+            Árbol reescrito (o el original si no cambió o no se pudo calificar)
+        """
+        qualified = self._qualify(tree, database, tables)
+        if qualified is None:
+            # Sin calificar no se sabe a qué tabla pertenece cada filtro: se cuentan completas
+            analysis.partition_filters = [(f"{table_db or database}.{table}", None) for table_db, table in tables]
+            return tree
+
+        pushed = pushdown_predicates(qualified.copy())
+        _remove_true_filters(pushed)
+        analysis.partition_filters = self._partition_filters(pushed, database)
+        if _filter_placement(pushed) == _filter_placement(qualified):
+            return tree
+
+        _restore_output_names(tree, pushed)
+        analysis.predicates_pushed = True
+        return pushed
+
+    def _qualify(self, tree: exp.Expression, database: str,
+                 tables: List[Tuple[str, str]]) -> Optional[exp.Expression]:
+        """
+        Califica columnas con el esquema de Glue (necesario para empujar predicados)
+
+        Returns:
+            Árbol calificado o None si falta algún esquema o la calificación falla
+        """
+        schema: Dict[str, Dict[str, Dict[str, str]]] = {}
+        for table_db, table in tables:
+            db = table_db or database
+            columns = self.estimator.get_schema(db, table)
+            if columns is None:
+                return None
+            schema.setdefault(db, {})[table] = columns
+
+        try:
+            return qualify(tree.copy(), db=database, schema=schema, dialect=DIALECT,
+                           quote_identifiers=False, identify=False)
+        except Exception as e:
+            logger.debug(f"No se pudo calificar la query: {e}")
+            return None
+
+    def _partition_filters(self, tree: exp.Expression, database: str) -> List[Tuple[str, Optional[str]]]:
+        """
+        Extrae, por cada referencia a una tabla, los filtros sobre columnas de
+        partición que Glue puede evaluar
+
+        Cada rama de un UNION y cada lado de un self-join es una referencia
+        distinta: la que no tiene filtro se escanea completa.
+
+        Returns:
+            Lista de ('database.tabla', expresión de Glue como "year = '2025'" o None)
+        """
+        filters = []
+
+        for scope in traverse_scope(tree):
+            for alias, source in scope.sources.items():
+                if not isinstance(source, exp.Table):
+                    continue
+
+                db = source.db or database
+                partition_keys = set(self.estimator.get_partition_keys(db, source.name))
+                conditions = [
+                    condition for condition in _source_conditions(scope.expression, alias)
+                    if _is_partition_filter(condition, alias, partition_keys)
+                ] if partition_keys else []
+
+                filters.append((f"{db}.{source.name}", " AND ".join(
+                    _unqualified(condition).sql(dialect=DIALECT) for condition in conditions
+                ) or None))
+
+        return filters
+
+    def _estimate(self, partition_filters: List[Tuple[str, Optional[str]]]) -> Optional[int]:
+        """Suma los bytes estimados de cada referencia a una tabla (None si ninguna es conocida)"""
+        total = None
+        for name, partition_filter in partition_filters:
+            db, _, table = name.partition(".")
+            size = self.estimator.estimate(db, table, partition_filter)
+            if size is not None:
+                total = (total or 0) + size
+        return total
+
+
+def _conjuncts(condition: exp.Expression) -> List[exp.Expression]:
+    """Separa una condición en sus términos unidos por AND"""
+    return list(condition.flatten()) if isinstance(condition, exp.And) else [condition]
+
+
+def _source_conditions(select: exp.Expression, alias: str) -> List[exp.Expression]:
+    """
+    Condiciones de un SELECT que restringen las filas leídas de la fuente alias
+
+    Las del WHERE y las del ON de un INNER JOIN valen para cualquier fuente;
+    las del ON de un LEFT JOIN solo para la tabla que se une (la de la
+    izquierda se lee completa). Las de RIGHT/FULL JOIN no se usan.
+    """
+    where = select.args.get('where')
+    conditions = _conjuncts(where.this) if where else []
+
+    for join in select.args.get('joins') or []:
+        on = join.args.get('on')
+        if on is None:
+            continue
+        if not join.side or (join.side == 'LEFT' and join.this.alias_or_name == alias):
+            conditions += _conjuncts(on)
+
+    return conditions
+
+
+def _is_partition_filter(condition: exp.Expression, alias: str, partition_keys: set) -> bool:
+    """True si la condición solo compara columnas de partición de la tabla con literales"""
+    if not isinstance(condition, (exp.EQ, exp.NEQ, exp.GT, exp.GTE, exp.LT, exp.LTE, exp.In, exp.Between)):
+        return False
+
+    columns = list(condition.find_all(exp.Column))
+    if not columns or condition.find(exp.Subquery, exp.Select):
+        return False
+
+    return all(column.table == alias and column.name in partition_keys for column in columns)
+
+
+def _unqualified(condition: exp.Expression) -> exp.Expression:
+    """Copia de la condición sin el prefijo de tabla en las columnas (formato de Glue)"""
+    condition = condition.copy()
+    for column in condition.find_all(exp.Column):
+        column.set('table', None)
+    return condition
+
+
+def _filter_placement(tree: exp.Expression) -> List[frozenset]:
+    """Condiciones del WHERE de cada SELECT, ignorando su orden (para detectar si se movieron)"""
+    return [
+        frozenset(
+            condition.sql(dialect=DIALECT) for condition in _conjuncts(select.args['where'].this)
+        ) if select.args.get('where') else frozenset()
+        for select in tree.find_all(exp.Select)
+    ]
+
+
+def _restore_output_names(original: exp.Expression, rewritten: exp.Expression):
+    """
+    Quita los alias que qualify agrega a expresiones sin nombre (p.ej. COUNT(*) AS _col_1)
+
+    Así las columnas del resultado conservan el nombre que les daría Athena.
+    """
+    if not isinstance(original, exp.Select) or not isinstance(rewritten, exp.Select):
+        return
+    if len(original.expressions) != len(rewritten.expressions):
+        return
+
+    for before, after in zip(original.expressions, rewritten.expressions):
+        if not isinstance(before, (exp.Alias, exp.Column)) and isinstance(after, exp.Alias):
+            after.replace(after.this)
+
+
+def _remove_true_filters(tree: exp.Expression):
+    """Quita los TRUE que deja pushdown_predicates en WHERE y ON al mover condiciones"""
+    for node in list(tree.find_all(exp.Where, exp.Join)):
+        key = 'this' if isinstance(node, exp.Where) else 'on'
+        condition = node.args.get(key)
+        if condition is None:
+            continue
+
+        conditions = [term for term in _conjuncts(condition) if not (isinstance(term, exp.Boolean) and term.this)]
+        if len(conditions) == len(_conjuncts(condition)):
+            continue
+        if conditions:
+            node.set(key, exp.and_(*conditions, copy=False))
+        elif isinstance(node, exp.Where):
+            node.pop()
+        # Un JOIN ... ON TRUE se deja: sin ON no es válido en Athena
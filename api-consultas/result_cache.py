@@ -0,0 +1,434 @@
+"""
+Cache de resultados de queries con stale-while-revalidate
+
+El almacenamiento es intercambiable (CACHE_BACKEND):
+
+- memory: diccionario LRU del proceso (un solo worker).
+- sqlite: archivo SQLite en modo WAL con mmap, compartido por todos los
+  workers de un mismo host.
+- redis: servidor Redis, compartido entre hosts/réplicas.
+
+Además de los resultados, el backend guarda las ejecuciones en curso por
+clave: solo el proceso que obtiene el lock ejecuta la query y publica su
+QueryExecutionId, de modo que el resto espera esa misma ejecución en vez de
+lanzar otra (single-flight entre procesos).
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import redis
+except ImportError:  # Dependencia opcional
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheEntry:
+    """Resultado cacheado y su antigüedad"""
+    value: Any
+    stored_at: float
+    fresh: bool
+
+    @property
+    def age_seconds(self) -> int:
+        return int(time.time() - self.stored_at)
+
+
+class MemoryBackend:
+    """Backend en memoria del proceso (LRU)"""
+
+    def __init__(self, max_entries: int = 256):
+        """
+        Args:
+            max_entries: Cantidad máxima de entradas (se descartan las menos usadas)
+        """
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._inflight: Dict[str, Tuple[str, Optional[str], float]] = {}
+        self._expired_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[Any, float, float]]:
+        """Devuelve (valor, stored_at, expired_at) o None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[1], self._expired_at
+
+    def set(self, key: str, value: Any, stored_at: float, ttl_seconds: int):
+        with self._lock:
+            self._entries[key] = (value, stored_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def expire_all(self):
+        with self._lock:
+            self._expired_at = time.time()
+
+    def get_expired_at(self) -> float:
+        return self._expired_at
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def acquire(self, key: str, owner: str, ttl_seconds: int) -> bool:
+        with self._lock:
+            current = self._inflight.get(key)
+            if current and current[2] > time.time():
+                return False
+            self._inflight[key] = (owner, None, time.time() + ttl_seconds)
+            return True
+
+    def set_execution_id(self, key: str, owner: str, execution_id: str):
+        with self._lock:
+            current = self._inflight.get(key)
+            if current and current[0] == owner:
+                self._inflight[key] = (owner, execution_id, current[2])
+
+    def get_inflight(self, key: str) -> Optional[Tuple[str, Optional[str]]]:
+        with self._lock:
+            current = self._inflight.get(key)
+            if current and current[2] > time.time():
+                return current[0], current[1]
+            return None
+
+    def release(self, key: str, owner: str):
+        with self._lock:
+            current = self._inflight.get(key)
+            if current and current[0] == owner:
+                del self._inflight[key]
+
+
+class SQLiteBackend:
+    """Backend en un archivo SQLite compartido por los workers del host"""
+
+    def __init__(self, path: str, max_entries: int = 256, mmap_bytes: int = 256 * 1024 ** 2):
+        """
+        Inicializa el backend (crea el archivo y las tablas si no existen)
+
+        Args:
+            path: Ruta del archivo SQLite (la misma para todos los workers)
+            max_entries: Cantidad máxima de entradas (se descartan las más antiguas)
+            mmap_bytes: Bytes del archivo mapeados en memoria (PRAGMA mmap_size)
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.mmap_bytes = mmap_bytes
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._conn() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    stored_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_meta (
+                    name TEXT PRIMARY KEY,
+                    value REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS inflight (
+                    key TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    execution_id TEXT,
+                    expires_at REAL NOT NULL
+                )
+            """)
+
+        logger.info(f"Cache SQLite inicializado - Path: {path}")
+
+    def _conn(self) -> sqlite3.Connection:
+        """Conexión del thread actual (se reutiliza: las lecturas van por mmap sin reabrir el archivo)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_bytes)}")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Tuple[Any, float, float]]:
+        """Devuelve (valor, stored_at, expired_at) o None"""
+        row = self._conn().execute(
+            "SELECT value, stored_at, "
+            "COALESCE((SELECT value FROM cache_meta WHERE name = 'expired_at'), 0) "
+            "FROM cache_entries WHERE key = ?",
+            (key,)
+        ).fetchone()
+        return (json.loads(row[0]), row[1], row[2]) if row else None
+
+    def set(self, key: str, value: Any, stored_at: float, ttl_seconds: int):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, value, stored_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), stored_at)
+            )
+            conn.execute("DELETE FROM cache_entries WHERE stored_at < ?", (time.time() - ttl_seconds,))
+            conn.execute(
+                "DELETE FROM cache_entries WHERE key IN "
+                "(SELECT key FROM cache_entries ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def expire_all(self):
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_meta (name, value) VALUES ('expired_at', ?)",
+                (time.time(),)
+            )
+
+    def get_expired_at(self) -> float:
+        row = self._conn().execute("SELECT value FROM cache_meta WHERE name = 'expired_at'").fetchone()
+        return row[0] if row else 0.0
+
+    def clear(self):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM cache_entries")
+
+    def acquire(self, key: str, owner: str, ttl_seconds: int) -> bool:
+        now = time.time()
+        with self._conn() as conn:
+            # Un lock vencido es de un worker que murió sin liberarlo
+            conn.execute("DELETE FROM inflight WHERE key = ? AND expires_at <= ?", (key, now))
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO inflight (key, owner, expires_at) VALUES (?, ?, ?)",
+                (key, owner, now + ttl_seconds)
+            )
+            return cursor.rowcount == 1
+
+    def set_execution_id(self, key: str, owner: str, execution_id: str):
+        with self._conn() as conn:
+            conn.execute(
+                "UPDATE inflight SET execution_id = ? WHERE key = ? AND owner = ?",
+                (execution_id, key, owner)
+            )
+
+    def get_inflight(self, key: str) -> Optional[Tuple[str, Optional[str]]]:
+        row = self._conn().execute(
+            "SELECT owner, execution_id FROM inflight WHERE key = ? AND expires_at > ?",
+            (key, time.time())
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def release(self, key: str, owner: str):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM inflight WHERE key = ? AND owner = ?", (key, owner))
+
+
+class RedisBackend:
+    """Backend en Redis compartido entre réplicas"""
+
+    # Borra el lock solo si sigue siendo de quien lo libera
+    RELEASE_SCRIPT = """
+        if redis.call('GET', KEYS[1]) == ARGV[1] then
+            return redis.call('DEL', KEYS[1], KEYS[2])
+        end
+        return 0
+    """
+
+    def __init__(self, url: str, prefix: str = "datalake-api:"):
+        """
+        Inicializa el backend
+
+        Args:
+            url: URL de Redis (redis://host:6379/0)
+            prefix: Prefijo de todas las claves
+        """
+        if redis is None:
+            raise RuntimeError("CACHE_BACKEND=redis requiere el paquete 'redis'")
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._release = self.client.register_script(self.RELEASE_SCRIPT)
+        logger.info(f"Cache Redis inicializado - URL: {url}")
+
+    def get(self, key: str) -> Optional[Tuple[Any, float, float]]:
+        """Devuelve (valor, stored_at, expired_at) o None"""
+        raw, expired_at = self.client.mget(f"{self.prefix}entry:{key}", f"{self.prefix}expired_at")
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        return entry["value"], entry["stored_at"], float(expired_at or 0)
+
+    def set(self, key: str, value: Any, stored_at: float, ttl_seconds: int):
+        self.client.set(
+            f"{self.prefix}entry:{key}",
+            json.dumps({"value": value, "stored_at": stored_at}),
+            ex=max(int(ttl_seconds), 1)
+        )
+
+    def expire_all(self):
+        self.client.set(f"{self.prefix}expired_at", time.time())
+
+    def get_expired_at(self) -> float:
+        return float(self.client.get(f"{self.prefix}expired_at") or 0)
+
+    def clear(self):
+        for name in self.client.scan_iter(match=f"{self.prefix}entry:*"):
+            self.client.delete(name)
+
+    def acquire(self, key: str, owner: str, ttl_seconds: int) -> bool:
+        return bool(self.client.set(f"{self.prefix}lock:{key}", owner, nx=True, ex=max(int(ttl_seconds), 1)))
+
+    def set_execution_id(self, key: str, owner: str, execution_id: str):
+        lock_key = f"{self.prefix}lock:{key}"
+        ttl = self.client.ttl(lock_key)
+        if ttl > 0:
+            self.client.set(f"{self.prefix}execution:{key}", execution_id, ex=ttl)
+
+    def get_inflight(self, key: str) -> Optional[Tuple[str, Optional[str]]]:
+        owner, execution_id = self.client.mget(f"{self.prefix}lock:{key}", f"{self.prefix}execution:{key}")
+        if owner is None:
+            return None
+        return owner.decode(), execution_id.decode() if execution_id else None
+
+    def release(self, key: str, owner: str):
+        self._release(keys=[f"{self.prefix}lock:{key}", f"{self.prefix}execution:{key}"], args=[owner])
+
+
+class ResultCache:
+    """
+    Cache con dos ventanas de validez
+
+    - Dentro de ttl_seconds la entrada es fresca y se sirve tal cual.
+    - Hasta stale_ttl_seconds se sirve igual, pero marcada como vencida para
+      que quien la lee dispare una actualización en segundo plano.
+    - Después se descarta.
+
+    Con un backend compartido los valores deben ser serializables a JSON.
+    """
+
+    def __init__(self, ttl_seconds: int, stale_ttl_seconds: int, max_entries: int = 256,
+                 backend=None, lock_ttl_seconds: int = 120):
+        """
+        Inicializa el cache
+
+        Args:
+            ttl_seconds: Segundos en que una entrada se considera fresca
+            stale_ttl_seconds: Segundos máximos en que una entrada vencida se sigue sirviendo
+            max_entries: Cantidad máxima de entradas del backend en memoria
+            backend: MemoryBackend, SQLiteBackend o RedisBackend (default: en memoria)
+            lock_ttl_seconds: Vigencia máxima del lock de una ejecución en curso
+        """
+        self.ttl_seconds = ttl_seconds
+        self.stale_ttl_seconds = max(stale_ttl_seconds, ttl_seconds)
+        self.lock_ttl_seconds = lock_ttl_seconds
+        self.backend = backend or MemoryBackend(max_entries)
+        self.shared = not isinstance(self.backend, MemoryBackend)
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """
+        Obtiene una entrada si todavía puede servirse
+
+        Args:
+            key: Clave de la query
+
+        Returns:
+            CacheEntry (con fresh=False si debe revalidarse) o None
+        """
+        entry = self.backend.get(key)
+        if entry is None:
+            return None
+
+        value, stored_at, expired_at = entry
+        age = time.time() - stored_at
+        if age > self.stale_ttl_seconds:
+            return None
+
+        return CacheEntry(value, stored_at, age <= self.ttl_seconds and stored_at > expired_at)
+
+    def set(self, key: str, value: Any) -> float:
+        """
+        Guarda (o reemplaza) el resultado de una query
+
+        Returns:
+            Epoch con el que quedó guardado (el mismo que devolverá get() en stored_at)
+        """
+        stored_at = time.time()
+        self.backend.set(key, value, stored_at, self.stale_ttl_seconds)
+        return stored_at
+
+    def expire_all(self):
+        """Marca todas las entradas como vencidas (se siguen sirviendo mientras se revalidan)"""
+        self.backend.expire_all()
+
+    def expired_at(self) -> float:
+        """Epoch del último expire_all (0 si nunca se llamó), visto por todos los procesos del backend"""
+        return self.backend.get_expired_at()
+
+    def clear(self):
+        """Elimina todas las entradas"""
+        self.backend.clear()
+
+    def acquire(self, key: str) -> Optional[str]:
+        """
+        Toma el lock de ejecución de una clave
+
+        Returns:
+            Token del dueño (para set_execution_id/release) o None si otro proceso ya la ejecuta
+        """
+        owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+        return owner if self.backend.acquire(key, owner, self.lock_ttl_seconds) else None
+
+    def set_execution_id(self, key: str, owner: str, execution_id: str):
+        """Publica el QueryExecutionId de la ejecución en curso para que otros procesos la esperen"""
+        self.backend.set_execution_id(key, owner, execution_id)
+
+    def get_inflight(self, key: str) -> Optional[Tuple[str, Optional[str]]]:
+        """
+        Consulta la ejecución en curso de una clave
+
+        Returns:
+            Tupla (dueño, QueryExecutionId o None si aún no empezó) o None si no hay ejecución
+        """
+        return self.backend.get_inflight(key)
+
+    def release(self, key: str, owner: str):
+        """Libera el lock de ejecución (solo si sigue siendo de owner)"""
+        self.backend.release(key, owner)
+
+
+def create_backend(name: str, max_entries: int = 256, sqlite_path: str = "data/result_cache.db",
+                   redis_url: str = "redis://localhost:6379/0"):
+    """
+    Crea el backend configurado en CACHE_BACKEND
+
+    Args:
+        name: 'memory', 'sqlite' o 'redis'
+        max_entries: Cantidad máxima de entradas (memory y sqlite)
+        sqlite_path: Archivo compartido del backend sqlite
+        redis_url: URL del backend redis
+
+    Raises:
+        ValueError: Si el backend no existe
+    """
+    if name == "memory":
+        return MemoryBackend(max_entries)
+    if name == "sqlite":
+        return SQLiteBackend(sqlite_path, max_entries)
+    if name == "redis":
+        return RedisBackend(redis_url)
+    raise ValueError(f"CACHE_BACKEND '{name}' no soportado (memory, sqlite, redis)")
@@ -0,0 +1,118 @@
+"""
+Registro persistente de resultados de Athena reutilizables
+
+Guarda, por fingerprint de query, el último QueryExecutionId exitoso y su
+hora de término. Una query repetida dentro de la ventana de validez lee el
+resultado ya escrito en ATHENA_OUTPUT_LOCATION en vez de volver a escanear
+el DataLake. Al vivir en SQLite sobrevive reinicios y se comparte entre
+procesos que usen el mismo archivo. Las entradas más antiguas que la ventana
+se borran al registrar nuevas.
+"""
+
+import logging
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ResultRegistry:
+    """Mapa fingerprint -> última ejecución exitosa, persistido en SQLite"""
+
+    def __init__(self, path: str, max_age_seconds: int = 3600):
+        """
+        Inicializa el registro (crea el archivo y la tabla si no existen)
+
+        Args:
+            path: Ruta del archivo SQLite
+            max_age_seconds: Antigüedad a partir de la cual una entrada ya no sirve y se borra
+        """
+        self.path = path
+        self.max_age_seconds = max_age_seconds
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS query_results (
+                    fingerprint TEXT NOT NULL,
+                    database TEXT NOT NULL,
+                    query_execution_id TEXT NOT NULL,
+                    completed_at REAL NOT NULL,
+                    PRIMARY KEY (fingerprint, database)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS query_results_completed_at ON query_results (completed_at)")
+
+        logger.info(f"ResultRegistry inicializado - Path: {path}")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Abre una conexión por operación (segura entre threads y procesos)"""
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def lookup(self, fingerprint: str, database: str, max_age_seconds: int) -> Optional[Tuple[str, float]]:
+        """
+        Busca una ejecución reciente para la query
+
+        Args:
+            fingerprint: Fingerprint de la query
+            database: Base de datos en la que se ejecutó
+            max_age_seconds: Antigüedad máxima aceptada del resultado
+
+        Returns:
+            Tupla (query_execution_id, completed_at) o None si no hay una vigente
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT query_execution_id, completed_at FROM query_results "
+                "WHERE fingerprint = ? AND database = ? AND completed_at >= ?",
+                (fingerprint, database, time.time() - max_age_seconds)
+            ).fetchone()
+
+        return (row[0], row[1]) if row else None
+
+    def record(self, fingerprint: str, database: str, query_execution_id: str,
+               completed_at: Optional[float] = None):
+        """
+        Registra la última ejecución exitosa de una query
+
+        También borra las entradas vencidas: sin esto cada query personalizada
+        distinta agregaría una fila hasta el próximo clear().
+
+        Args:
+            fingerprint: Fingerprint de la query
+            database: Base de datos en la que se ejecutó
+            query_execution_id: ID de la ejecución en Athena
+            completed_at: Epoch de término (default: ahora)
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO query_results "
+                "(fingerprint, database, query_execution_id, completed_at) VALUES (?, ?, ?, ?)",
+                (fingerprint, database, query_execution_id, completed_at or time.time())
+            )
+            conn.execute("DELETE FROM query_results WHERE completed_at < ?", (time.time() - self.max_age_seconds,))
+
+    def forget(self, fingerprint: str, database: str):
+        """Elimina la entrada de una query (p.ej. si su resultado ya no existe en S3)"""
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM query_results WHERE fingerprint = ? AND database = ?",
+                (fingerprint, database)
+            )
+
+    def clear(self):
+        """Elimina todas las entradas (p.ej. tras una nueva ingesta)"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM query_results")
@@ -0,0 +1,170 @@
+"""
+Tareas en segundo plano de la API: precalentado de cache y liveness de Athena
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+
+class CacheWarmer:
+    """Refresca periódicamente las queries más consultadas"""
+
+    def __init__(self, queries: List[str], interval_seconds: int,
+                 refresh: Callable[[str, bool], Awaitable[bool]], max_concurrency: int = 3,
+                 sync: Optional[Callable[[], Any]] = None):
+        """
+        Inicializa el warmer
+
+        Args:
+            queries: Claves de PREDEFINED_QUERIES a mantener en cache
+            interval_seconds: Segundos entre refrescos (0 = solo bajo demanda)
+            refresh: Corutina refresh(query_name, force) que ejecuta y cachea una query
+            max_concurrency: Queries refrescadas en paralelo
+            sync: Función bloqueante que se ejecuta antes de cada refresco (p.ej. copiar el DataLake)
+        """
+        self.queries = queries
+        self.interval_seconds = interval_seconds
+        self.refresh = refresh
+        self.max_concurrency = max_concurrency
+        self.sync = sync
+        self.last_run_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._force = False
+
+    def start(self):
+        """Inicia el loop en el event loop actual"""
+        if self.queries or self.sync:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"CacheWarmer iniciado - {len(self.queries)} queries, intervalo {self.interval_seconds}s")
+
+    async def stop(self):
+        """Detiene el loop"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def trigger(self, force: bool = True):
+        """
+        Adelanta el próximo refresco (p.ej. tras una nueva ingesta)
+
+        Args:
+            force: Ignorar resultados reutilizables y volver a escanear el DataLake
+        """
+        self._force = self._force or force
+        self._wakeup.set()
+
+    async def _run(self):
+        """Refresca al iniciar, cada interval_seconds y cada vez que se llama trigger()"""
+        while True:
+            force, self._force = self._force, False
+            self._wakeup.clear()
+            await self.refresh_all(force)
+
+            timeout = self.interval_seconds if self.interval_seconds > 0 else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def refresh_all(self, force: bool = False) -> Dict[str, bool]:
+        """
+        Refresca todas las queries configuradas
+
+        Args:
+            force: Ignorar resultados reutilizables
+
+        Returns:
+            Diccionario query -> éxito
+        """
+        start_time = time.time()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        if self.sync:
+            try:
+                await run_in_threadpool(self.sync)
+            except Exception as e:
+                logger.error(f"Error sincronizando antes del refresco: {e}")
+
+        async def refresh_one(query_name: str) -> bool:
+            async with semaphore:
+                try:
+                    return await self.refresh(query_name, force)
+                except Exception as e:
+                    logger.error(f"Error refrescando {query_name}: {e}")
+                    return False
+
+        results = await asyncio.gather(*[refresh_one(query) for query in self.queries])
+        self.last_run_at = time.time()
+
+        status = dict(zip(self.queries, results))
+        logger.info(
+            f"Cache refrescado en {int((time.time() - start_time) * 1000)}ms - "
+            f"{sum(results)}/{len(results)} queries OK{' (forzado)' if force else ''}"
+        )
+        return status
+
+
+class LivenessMonitor:
+    """Verifica periódicamente la conexión con Athena y guarda el último estado"""
+
+    def __init__(self, check: Callable[[], None], interval_seconds: int):
+        """
+        Inicializa el monitor
+
+        Args:
+            check: Función bloqueante que lanza una excepción si Athena no responde
+            interval_seconds: Segundos entre verificaciones
+        """
+        self.check = check
+        self.interval_seconds = interval_seconds
+        self.healthy: Optional[bool] = None
+        self.error: Optional[str] = None
+        self.checked_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Inicia el loop en el event loop actual"""
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Detiene el loop"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def is_stale(self) -> bool:
+        """True si no hay un estado reciente (el loop no corre o se atrasó)"""
+        return self.checked_at is None or time.time() - self.checked_at > 2 * self.interval_seconds
+
+    async def refresh(self) -> bool:
+        """Verifica la conexión ahora y actualiza el estado"""
+        try:
+            await run_in_threadpool(self.check)
+            self.healthy, self.error = True, None
+        except Exception as e:
+            if self.healthy is not False:
+                logger.error(f"Athena no responde: {e}")
+            self.healthy, self.error = False, str(e)
+        self.checked_at = time.time()
+        return self.healthy
+
+    async def _run(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.interval_seconds)
@@ -0,0 +1,218 @@
+"""
+Serialización y compresión de respuestas de la API
+
+- FastJSONResponse serializa con orjson (si está instalado) sin volver a
+  validar cada fila con pydantic, y responde 304 a un GET condicional
+  (If-None-Match) antes de serializar.
+- CompressionMiddleware comprime con zstd o gzip según Accept-Encoding,
+  solo si el cuerpo supera un tamaño mínimo.
+"""
+
+import gzip
+import hashlib
+import json
+from typing import Any, Optional
+
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # Dependencia opcional
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # Dependencia opcional
+    zstandard = None
+
+# Cuerpos más grandes se comprimen en un thread para no bloquear el event loop
+THREADPOOL_COMPRESSION_BYTES = 512 * 1024
+
+# Tipos de contenido que vale la pena comprimir
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+
+def _default(obj: Any) -> Any:
+    """Serializa modelos pydantic (construidos sin validar) como diccionarios"""
+    if isinstance(obj, BaseModel):
+        # En el orden declarado (model_construct no lo conserva en __dict__)
+        return {name: getattr(obj, name) for name in obj.model_fields}
+    raise TypeError(f"Tipo no serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """
+    Serializa a JSON (UTF-8)
+
+    Args:
+        content: Diccionario, lista o modelo pydantic
+
+    Returns:
+        JSON en bytes
+    """
+    if orjson:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def make_etag(cache_key: str, stored_at: float) -> str:
+    """
+    ETag débil de un resultado cacheado (cambia cuando se vuelve a ejecutar la query)
+
+    Args:
+        cache_key: Clave del resultado en el cache
+        stored_at: Epoch en que se guardó el resultado
+    """
+    digest = hashlib.sha1(f"{cache_key}:{stored_at!r}".encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Compara If-None-Match con el ETag (comparación débil, RFC 9110)"""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+
+class FastJSONResponse(Response):
+    """
+    Respuesta JSON que se serializa recién al enviarse
+
+    Si el request es un GET/HEAD con If-None-Match igual al ETag, responde 304
+    sin serializar el contenido.
+    """
+
+    media_type = "application/json"
+
+    def __init__(self, content: Any, status_code: int = 200, etag: Optional[str] = None):
+        """
+        Args:
+            content: Diccionario, lista o modelo pydantic a serializar
+            status_code: Código HTTP
+            etag: ETag del contenido (opcional)
+        """
+        self.content = content
+        self.status_code = status_code
+        self.background = None
+        self.body = b""
+        self.etag = etag
+        self.init_headers({"etag": etag} if etag else None)
+
+    async def __call__(self, scope, receive, send):
+        if self.etag and scope.get("method") in ("GET", "HEAD"):
+            if_none_match = Headers(scope=scope).get("if-none-match")
+            if if_none_match and _etag_matches(if_none_match, self.etag):
+                await Response(status_code=304, headers={"etag": self.etag})(scope, receive, send)
+                return
+
+        self.body = dumps(self.content)
+        self.headers["content-length"] = str(len(self.body))
+        await super().__call__(scope, receive, send)
+
+
+def _accepted_encodings(accept_encoding: str) -> dict:
+    """Parsea Accept-Encoding en {codificación: q}"""
+    encodings = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            encodings[name.strip().lower()] = q
+    return encodings
+
+
+class CompressionMiddleware:
+    """
+    Middleware ASGI de compresión negociada (zstd > gzip)
+
+    Solo comprime respuestas de un único bloque (no streaming) con un tipo de
+    contenido comprimible y al menos minimum_size bytes.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, zstd_level: int = 3):
+        """
+        Args:
+            app: Aplicación ASGI
+            minimum_size: Bytes mínimos del cuerpo para comprimir
+            gzip_level: Nivel de compresión gzip (1-9)
+            zstd_level: Nivel de compresión zstd (1-22)
+        """
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.zstd_level = zstd_level
+
+    def _choose_encoding(self, accept_encoding: str) -> Optional[str]:
+        """Elige la codificación con mayor q (a igual q, zstd)"""
+        encodings = _accepted_encodings(accept_encoding)
+        supported = ("zstd", "gzip") if zstandard else ("gzip",)
+        candidates = [(encodings.get(name, 0), -rank, name) for rank, name in enumerate(supported)]
+        q, _, name = max(candidates)
+        return name if q > 0 else None
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "zstd":
+            return zstandard.ZstdCompressor(level=self.zstd_level).compress(body)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self._choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+
+        async def send_compressed(message):
+            nonlocal start_message
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+
+            if start_message is None:
+                await send(message)
+                return
+
+            headers = MutableHeaders(raw=start_message["headers"])
+            body = message.get("body", b"")
+            compressible = (
+                not message.get("more_body", False)
+                and len(body) >= self.minimum_size
+                and "content-encoding" not in headers
+                and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+            )
+
+            if compressible:
+                if len(body) > THREADPOOL_COMPRESSION_BYTES:
+                    body = await run_in_threadpool(self._compress, body, encoding)
+                else:
+                    body = self._compress(body, encoding)
+                headers["content-encoding"] = encoding
+                headers["content-length"] = str(len(body))
+                headers.add_vary_header("Accept-Encoding")
+                message = {**message, "body": body}
+
+            await send(start_message)
+            start_message = None
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,9 @@
+"""
+Configuración de pytest: los módulos de la API se importan desde api-consultas/
+(igual que en el contenedor, donde se copian a /app)
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,51 @@
+"""Tests de AthenaClient con un Athena falso (sin llamadas a AWS)"""
+
+import pytest
+from botocore.exceptions import ClientError
+
+from athena_client import AthenaClient
+from benchmark.fake_aws import FakeAthena
+
+
+class NoWorkGroupPermission(FakeAthena):
+    """Rol sin athena:GetWorkGroup"""
+
+    def get_work_group(self, WorkGroup):
+        self.work_group_calls = getattr(self, "work_group_calls", 0) + 1
+        raise ClientError({"Error": {"Code": "AccessDeniedException", "Message": "denied"}}, "GetWorkGroup")
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv("RESULT_REGISTRY_PATH", str(tmp_path / "registry.db"))
+    return AthenaClient(region_name="us-east-1")
+
+
+def test_check_connection_uses_get_work_group(client):
+    client.athena = FakeAthena(queue_delay=0, run_delay=0)
+
+    client.check_connection()
+
+    assert client.athena.started == 0
+
+
+def test_check_connection_falls_back_to_select_1_without_permission(client):
+    client.athena = NoWorkGroupPermission(queue_delay=0, run_delay=0, rows=1)
+
+    client.check_connection()
+    client.check_connection()
+
+    # El permiso se consulta una sola vez; después se verifica con SELECT 1
+    assert client.athena.work_group_calls == 1
+    assert client.athena.started == 2
+
+
+def test_check_connection_propagates_other_errors(client):
+    class Unavailable(FakeAthena):
+        def get_work_group(self, WorkGroup):
+            raise ClientError({"Error": {"Code": "InternalServerException", "Message": "down"}}, "GetWorkGroup")
+
+    client.athena = Unavailable()
+
+    with pytest.raises(ClientError):
+        client.check_connection()
@@ -0,0 +1,74 @@
+"""Tests de la normalización, el binding de parámetros y el fingerprint de queries"""
+
+import pytest
+
+from fingerprint import bind_parameters, normalize_query, parameterize_query, query_fingerprint
+from queries import PREDEFINED_QUERIES
+
+
+def test_collapses_whitespace_and_lowercases_keywords():
+    assert normalize_query("SELECT  id,\n\tName\nFROM   Orders") == "select id, name from orders"
+
+
+def test_removes_comments():
+    assert normalize_query("SELECT a -- columna\nFROM t /* tabla */ WHERE b = 1") == "select a from t where b = 1"
+    assert normalize_query("SELECT a/*x*/FROM t") == "select a from t"
+
+
+@pytest.mark.parametrize("literal", ["'a -- b'", "'¿qué?'", "'it''s'", "'/* no es comentario */'", "'MiXtO'"])
+def test_string_literals_are_kept_verbatim(literal):
+    assert normalize_query(f"SELECT {literal} FROM t") == f"select {literal} from t"
+
+
+def test_quoted_identifiers_are_kept_verbatim():
+    assert normalize_query('SELECT "Col--X", "a""b" FROM "Tabla"') == 'select "Col--X", "a""b" from "Tabla"'
+
+
+@pytest.mark.parametrize("query", ["SELECT 1;", "SELECT 1 ;", "SELECT 1;;", "SELECT 1; -- fin"])
+def test_removes_trailing_semicolon(query):
+    assert normalize_query(query) == "select 1"
+
+
+def test_semicolon_inside_literal_is_kept():
+    assert normalize_query("SELECT 'x;'") == "select 'x;'"
+
+
+def test_parameterize_replaces_only_real_literals():
+    template, literals = parameterize_query("SELECT t1.a, 'it''s?' FROM t1 WHERE b = 2.5 AND c = -3 -- 4")
+
+    assert template == "select t1.a, ? from t1 where b = ? and c = -?"
+    assert literals == ["'it''s?'", "2.5", "3"]
+
+
+def test_bind_ignores_question_marks_inside_literals_and_identifiers():
+    statement = "SELECT '?', \"?\" FROM t WHERE a = ? -- ?\nAND b = ?"
+
+    assert bind_parameters(statement, ["'o''k'", 3]) == (
+        "SELECT '?', \"?\" FROM t WHERE a = 'o''k' -- ?\nAND b = 3"
+    )
+
+
+@pytest.mark.parametrize("parameters", [[1], [1, 2, 3]])
+def test_bind_requires_one_value_per_placeholder(parameters):
+    with pytest.raises(ValueError):
+        bind_parameters("SELECT * FROM t WHERE a = ? AND b = ?", parameters)
+
+
+def test_fingerprint_ignores_formatting():
+    assert query_fingerprint("SELECT * FROM t WHERE a = 1;") == query_fingerprint("select *\nfrom t -- c\nwhere a = 1")
+
+
+def test_fingerprint_depends_on_literals():
+    assert query_fingerprint("SELECT * FROM t WHERE a = 1") != query_fingerprint("SELECT * FROM t WHERE a = 2")
+    assert query_fingerprint("SELECT * FROM t WHERE a = 'X'") != query_fingerprint("SELECT * FROM t WHERE a = 'x'")
+
+
+def test_predefined_statement_matches_hand_written_query():
+    statement = PREDEFINED_QUERIES["productos_top"]
+    hand_written = (
+        "select name, category, price, stock, PRICE * STOCK AS valor_inventario -- valor en stock\n"
+        "from mysql_ms1_products where stock > 0 order by valor_inventario desc limit 7;"
+    )
+
+    assert query_fingerprint(statement, [7]) == query_fingerprint(hand_written)
+    assert query_fingerprint(statement, [7]) != query_fingerprint(statement, [8])
@@ -0,0 +1,99 @@
+"""Tests del motor local (DuckDB) sobre un directorio con particiones year=/month=/day="""
+
+import json
+import os
+
+import pytest
+
+pytest.importorskip("duckdb")
+
+from local_engine import LocalQueryEngine
+from queries import PREDEFINED_QUERIES
+
+STATEMENT = PREDEFINED_QUERIES["ventas_resumen"]
+
+
+def write_orders(directory, day: str, amounts):
+    """Escribe un archivo JSON Lines de órdenes en la partición del día"""
+    partition = os.path.join(directory, "year=2025", "month=01", f"day={day}")
+    os.makedirs(partition, exist_ok=True)
+    with open(os.path.join(partition, "orders.json"), "w") as f:
+        for i, amount in enumerate(amounts):
+            f.write(json.dumps({"id": f"{day}-{i}", "user_id": "u1", "total_amount": amount, "status": "paid"}) + "\n")
+
+
+@pytest.fixture
+def lake(tmp_path):
+    directory = str(tmp_path / "mysql_ms1_orders")
+    write_orders(directory, "01", [10.0, 20.0])
+    return directory
+
+
+def make_engine(lake, max_table_bytes=1024 ** 2):
+    return LocalQueryEngine({"mysql_ms1_orders": lake}, cache_dir="unused", s3_client=None,
+                            max_table_bytes=max_table_bytes)
+
+
+def test_executes_predefined_query_after_sync(lake):
+    engine = make_engine(lake)
+    assert not engine.can_execute("ventas_resumen", STATEMENT)
+
+    engine.sync()
+    results, stats = engine.execute("ventas_resumen", STATEMENT)
+
+    assert engine.can_execute("ventas_resumen", STATEMENT)
+    assert results[0]["total_ordenes"] == "2" and results[0]["ventas_totales"] == "30.0"
+    assert stats.engine == "local"
+
+
+def test_tables_over_max_size_go_to_athena(lake):
+    engine = make_engine(lake, max_table_bytes=10)
+    engine.sync()
+
+    assert not engine.can_execute("ventas_resumen", STATEMENT)
+
+
+def test_is_outdated_until_synced_after_the_last_ingestion(lake):
+    engine = make_engine(lake)
+    engine.sync()
+    ingested_at = [0.0]
+    engine.ingestion_watermark = lambda: ingested_at[0]
+    assert not engine.is_outdated()
+
+    ingested_at[0] = engine.synced_at + 1
+    assert engine.is_outdated()
+
+    engine.synced_at = ingested_at[0] + 1
+    assert not engine.is_outdated()
+
+
+def test_unreadable_watermark_counts_as_outdated(lake):
+    engine = make_engine(lake)
+    engine.sync()
+
+    def unavailable():
+        raise ConnectionError("redis caído")
+
+    engine.ingestion_watermark = unavailable
+    assert engine.is_outdated()
+
+
+def test_sync_reloads_tables_whose_files_changed(lake):
+    engine = make_engine(lake)
+    engine.sync()
+    write_orders(lake, "02", [5.0])
+    engine.sync()
+
+    results, _ = engine.execute("ventas_resumen", STATEMENT)
+    assert results[0]["total_ordenes"] == "3"
+
+
+def test_table_that_outgrows_the_maximum_is_dropped(lake):
+    engine = make_engine(lake)
+    engine.sync()
+    engine.max_table_bytes = 10
+    engine.sync()
+
+    assert not engine.can_execute("ventas_resumen", STATEMENT)
+    with pytest.raises(Exception):
+        engine.execute("ventas_resumen", STATEMENT)
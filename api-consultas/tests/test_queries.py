@@ -0,0 +1,32 @@
+"""Tests de la validación de parámetros de las queries predefinidas"""
+
+import pytest
+
+from queries import query_parameters
+
+
+def test_uses_defaults_for_missing_parameters():
+    assert query_parameters("productos_top") == [10]
+    assert query_parameters("ventas_resumen", {}) == []
+
+
+@pytest.mark.parametrize("value, expected", [(5, 5), ("7", 7), (8.0, 8)])
+def test_coerces_integer_values(value, expected):
+    assert query_parameters("productos_top", {"limit": value}) == [expected]
+
+
+@pytest.mark.parametrize("value", ["abc", 5.7, True, None, [5]])
+def test_rejects_non_integer_values(value):
+    with pytest.raises(ValueError, match="entero"):
+        query_parameters("productos_top", {"limit": value})
+
+
+@pytest.mark.parametrize("params", [{"limit": 0}, {"limit": 101}, {"threshold": 5}])
+def test_rejects_out_of_range_or_unknown_parameters(params):
+    with pytest.raises(ValueError):
+        query_parameters("productos_top", params)
+
+
+def test_unknown_query_raises_key_error():
+    with pytest.raises(KeyError):
+        query_parameters("no_existe")
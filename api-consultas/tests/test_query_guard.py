@@ -0,0 +1,189 @@
+"""Tests de query_guard: parseo, reescritura y estimación de queries personalizadas"""
+
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError
+
+from query_guard import EstimateUnavailable, QueryGuard, QueryRejected, TableSizeEstimator
+
+DATABASE = "datalake_raw"
+TABLE_BYTES = 30 * 1024 ** 2
+PARTITION_BYTES = 1024 ** 2
+
+TABLES = {
+    "orders": ["id", "user_id", "total_amount", "status", "created_at"],
+    "users": ["id", "username", "email", "created_at"],
+}
+
+
+class FakeGlue:
+    """Glue con tablas particionadas por year/month/day; cualquier filtro selecciona una partición"""
+
+    def __init__(self):
+        self.expressions = []
+
+    def get_table(self, DatabaseName, Name):
+        if Name not in TABLES:
+            raise ClientError({"Error": {"Code": "EntityNotFoundException", "Message": Name}}, "GetTable")
+        return {"Table": {
+            "Name": Name,
+            "StorageDescriptor": {"Columns": [{"Name": column, "Type": "string"} for column in TABLES[Name]]},
+            "PartitionKeys": [{"Name": key, "Type": "string"} for key in ("year", "month", "day")],
+            "Parameters": {"sizeKey": str(TABLE_BYTES)},
+        }}
+
+    def get_paginator(self, operation):
+        return self
+
+    def paginate(self, DatabaseName, TableName, Expression):
+        self.expressions.append((TableName, Expression))
+        return [{"Partitions": [{"Parameters": {"sizeKey": str(PARTITION_BYTES)}}]}]
+
+
+class UnavailableGlue:
+    """Glue sin conexión"""
+
+    def get_table(self, DatabaseName, Name):
+        raise EndpointConnectionError(endpoint_url="https://glue.us-east-1.amazonaws.com")
+
+
+def make_guard(glue=None, default_limit=1000, scan_budget_bytes=0, fail_open=True):
+    estimator = TableSizeEstimator(glue or FakeGlue(), s3_client=None)
+    return QueryGuard(estimator, default_limit=default_limit, scan_budget_bytes=scan_budget_bytes,
+                      fail_open=fail_open)
+
+
+@pytest.mark.parametrize("query", [
+    "DROP TABLE orders",
+    "INSERT INTO orders SELECT * FROM orders",
+    "DELETE FROM orders",
+    "SELECT 1; SELECT 2",
+    "SELEC * FROM orders",
+])
+def test_rejects_anything_but_a_single_select(query):
+    with pytest.raises(QueryRejected):
+        make_guard().analyze(query, DATABASE)
+
+
+def test_keywords_inside_identifiers_are_allowed():
+    analysis = make_guard().analyze("SELECT created_at, status FROM orders", DATABASE)
+
+    assert analysis.tables == ["orders"]
+
+
+def test_injects_default_limit_only_when_missing():
+    guard = make_guard(default_limit=50)
+
+    injected = guard.analyze("SELECT id FROM orders", DATABASE)
+    kept = guard.analyze("SELECT id FROM orders LIMIT 5", DATABASE)
+
+    assert injected.limit_injected and injected.query.endswith("LIMIT 50")
+    assert not kept.limit_injected and kept.query == "SELECT id FROM orders LIMIT 5"
+
+
+def test_unfiltered_table_is_estimated_at_full_size():
+    analysis = make_guard().analyze("SELECT id FROM orders", DATABASE)
+
+    assert analysis.estimated_scan_bytes == TABLE_BYTES
+
+
+def test_where_partition_filter_is_estimated_by_partition():
+    glue = FakeGlue()
+    analysis = make_guard(glue).analyze("SELECT id FROM orders WHERE year = '2025' AND status = 'paid'", DATABASE)
+
+    assert analysis.estimated_scan_bytes == PARTITION_BYTES
+    assert glue.expressions == [("orders", "year = '2025'")]
+
+
+def test_union_branch_without_filter_counts_full_table():
+    analysis = make_guard().analyze(
+        "SELECT id FROM orders WHERE year = '2025' UNION ALL SELECT id FROM orders", DATABASE
+    )
+
+    assert analysis.estimated_scan_bytes == TABLE_BYTES + PARTITION_BYTES
+
+
+def test_self_join_counts_each_reference():
+    analysis = make_guard().analyze(
+        "SELECT a.id FROM orders a JOIN orders b ON a.user_id = b.user_id WHERE a.year = '2025'", DATABASE
+    )
+
+    assert analysis.estimated_scan_bytes == TABLE_BYTES + PARTITION_BYTES
+
+
+def test_join_on_partition_filter_is_used():
+    analysis = make_guard().analyze(
+        "SELECT o.id FROM orders o JOIN users u ON o.user_id = u.id AND u.year = '2025' "
+        "WHERE o.year = '2025'",
+        DATABASE
+    )
+
+    assert analysis.estimated_scan_bytes == 2 * PARTITION_BYTES
+
+
+def test_left_join_on_filter_does_not_restrict_the_left_table():
+    analysis = make_guard().analyze(
+        "SELECT o.id FROM orders o LEFT JOIN users u ON o.user_id = u.id AND o.year = '2025'", DATABASE
+    )
+
+    assert analysis.estimated_scan_bytes == 2 * TABLE_BYTES
+
+
+def test_filters_are_pushed_into_subqueries_without_true_leftovers():
+    analysis = make_guard().analyze(
+        "SELECT t.id FROM (SELECT id, year FROM orders) AS t WHERE t.year = '2025' AND t.id > 10", DATABASE
+    )
+
+    assert analysis.predicates_pushed
+    assert analysis.estimated_scan_bytes == PARTITION_BYTES
+    assert "TRUE" not in analysis.query.upper()
+
+
+def test_pushed_join_filters_leave_no_true_conjuncts():
+    analysis = make_guard().analyze(
+        "SELECT o.id FROM orders o JOIN users u ON o.user_id = u.id "
+        "WHERE u.year = '2025' AND o.year = '2025' AND o.status = 'paid'",
+        DATABASE
+    )
+
+    assert analysis.estimated_scan_bytes == 2 * PARTITION_BYTES
+    assert "TRUE" not in analysis.query.upper()
+
+
+def test_unknown_table_is_not_estimated():
+    analysis = make_guard().analyze("SELECT * FROM missing_table", DATABASE)
+
+    assert analysis.estimated_scan_bytes is None
+
+
+def test_rejects_queries_over_the_scan_budget():
+    guard = make_guard(scan_budget_bytes=TABLE_BYTES)
+
+    with pytest.raises(QueryRejected) as rejected:
+        guard.analyze("SELECT a.id FROM orders a JOIN orders b ON a.id = b.id", DATABASE)
+
+    assert rejected.value.estimated_scan_bytes == 2 * TABLE_BYTES
+    assert guard.analyze("SELECT id FROM orders", DATABASE).estimated_scan_bytes == TABLE_BYTES
+
+
+def test_metadata_errors_keep_parse_and_limit_when_failing_open():
+    analysis = make_guard(UnavailableGlue(), default_limit=10).analyze("SELECT id FROM orders", DATABASE)
+
+    assert analysis.estimated_scan_bytes is None
+    assert analysis.query.endswith("LIMIT 10")
+    with pytest.raises(QueryRejected):
+        make_guard(UnavailableGlue()).analyze("DROP TABLE orders", DATABASE)
+
+
+def test_metadata_errors_reject_when_failing_closed():
+    with pytest.raises(EstimateUnavailable):
+        make_guard(UnavailableGlue(), fail_open=False).analyze("SELECT id FROM orders", DATABASE)
+
+
+def test_estimator_cache_is_bounded():
+    estimator = TableSizeEstimator(FakeGlue(), s3_client=None, max_entries=5)
+    for day in range(50):
+        estimator.estimate(DATABASE, "orders", f"day = '{day:02d}'")
+
+    assert len(estimator._cache) == 5
+    # La definición de la tabla se usa en cada estimación: sigue entre las más recientes
+    assert ("table", DATABASE, "orders") in estimator._cache
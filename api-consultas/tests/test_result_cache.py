@@ -0,0 +1,166 @@
+"""Tests de result_cache: ventanas fresh/stale, expire_all y lock de ejecución"""
+
+import types
+
+import pytest
+
+import result_cache
+from result_cache import MemoryBackend, ResultCache, SQLiteBackend, create_backend
+
+
+class FakeClock:
+    """Reemplaza time.time() en result_cache para avanzar el tiempo sin esperar"""
+
+    def __init__(self, now: float = 1_700_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(result_cache, "time", types.SimpleNamespace(time=clock.time))
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    """Crea caches sobre el mismo backend compartido (sqlite) o uno por cache (memory)"""
+    def make(**kwargs):
+        kwargs.setdefault("ttl_seconds", 60)
+        kwargs.setdefault("stale_ttl_seconds", 300)
+        if request.param == "sqlite":
+            kwargs["backend"] = SQLiteBackend(str(tmp_path / "cache.db"), max_entries=kwargs.pop("max_entries", 256))
+        return ResultCache(**kwargs)
+    return make
+
+
+def test_entry_is_fresh_then_stale_then_dropped(make_cache, clock):
+    cache = make_cache()
+    stored_at = cache.set("k", {"results": [1]})
+
+    entry = cache.get("k")
+    assert entry.value == {"results": [1]} and entry.fresh and entry.stored_at == stored_at
+
+    clock.advance(61)
+    entry = cache.get("k")
+    assert entry is not None and not entry.fresh
+
+    clock.advance(300)
+    assert cache.get("k") is None
+
+
+def test_expire_all_marks_previous_entries_stale(make_cache, clock):
+    cache = make_cache()
+    cache.set("old", 1)
+    assert cache.expired_at() == 0
+
+    clock.advance(1)
+    cache.expire_all()
+    assert cache.expired_at() == clock.now
+    assert not cache.get("old").fresh
+
+    clock.advance(1)
+    cache.set("new", 2)
+    assert cache.get("new").fresh
+
+
+def test_clear_removes_entries(make_cache, clock):
+    cache = make_cache()
+    cache.set("k", 1)
+    cache.clear()
+
+    assert cache.get("k") is None
+
+
+def test_lock_is_exclusive_until_released(make_cache, clock):
+    cache = make_cache()
+
+    owner = cache.acquire("k")
+    assert owner is not None
+    assert cache.acquire("k") is None
+    assert cache.get_inflight("k") == (owner, None)
+
+    cache.set_execution_id("k", owner, "exec-1")
+    assert cache.get_inflight("k") == (owner, "exec-1")
+
+    # Solo el dueño libera (o publica su ejecución)
+    cache.set_execution_id("k", "otro", "exec-2")
+    cache.release("k", "otro")
+    assert cache.get_inflight("k") == (owner, "exec-1")
+
+    cache.release("k", owner)
+    assert cache.get_inflight("k") is None
+    assert cache.acquire("k") is not None
+
+
+def test_lock_expires_after_lock_ttl(make_cache, clock):
+    cache = make_cache(lock_ttl_seconds=10)
+    owner = cache.acquire("k")
+
+    clock.advance(11)
+    assert cache.get_inflight("k") is None
+
+    new_owner = cache.acquire("k")
+    assert new_owner is not None and new_owner != owner
+
+    # El dueño anterior (p.ej. un worker colgado) ya no puede liberar el lock nuevo
+    cache.release("k", owner)
+    assert cache.get_inflight("k") == (new_owner, None)
+
+
+def test_locks_are_per_key(make_cache, clock):
+    cache = make_cache()
+
+    assert cache.acquire("a") is not None
+    assert cache.acquire("b") is not None
+
+
+def test_memory_backend_evicts_least_recently_used(clock):
+    cache = ResultCache(ttl_seconds=60, stale_ttl_seconds=300, max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a").value == 1 and cache.get("c").value == 3
+
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path, clock):
+    path = str(tmp_path / "cache.db")
+    worker_a = ResultCache(60, 300, backend=SQLiteBackend(path))
+    worker_b = ResultCache(60, 300, backend=SQLiteBackend(path))
+
+    worker_a.set("k", {"results": [{"a": "1"}]})
+    assert worker_b.get("k").value == {"results": [{"a": "1"}]}
+
+    owner = worker_a.acquire("k")
+    assert worker_b.acquire("k") is None
+    worker_a.set_execution_id("k", owner, "exec-1")
+    assert worker_b.get_inflight("k") == (owner, "exec-1")
+
+    worker_b.expire_all()
+    assert not worker_a.get("k").fresh
+    assert worker_a.expired_at() == clock.now
+
+
+def test_sqlite_backend_keeps_max_entries(tmp_path, clock):
+    cache = ResultCache(60, 300, backend=SQLiteBackend(str(tmp_path / "cache.db"), max_entries=2))
+    for key in ("a", "b", "c"):
+        clock.advance(1)
+        cache.set(key, key)
+
+    assert cache.get("a") is None
+    assert cache.get("c").value == "c"
+
+
+def test_create_backend_rejects_unknown_names():
+    assert isinstance(create_backend("memory"), MemoryBackend)
+    with pytest.raises(ValueError):
+        create_backend("memcached")
@@ -0,0 +1,77 @@
+"""Tests del registro de resultados reutilizables y su uso en AthenaClient"""
+
+import sqlite3
+import time
+
+import pytest
+
+from athena_client import AthenaClient
+from result_registry import ResultRegistry
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return ResultRegistry(str(tmp_path / "registry.db"), max_age_seconds=600)
+
+
+def count_rows(registry) -> int:
+    with registry._connect() as conn:
+        return conn.execute("SELECT COUNT(*) FROM query_results").fetchone()[0]
+
+
+def test_lookup_respects_max_age(registry):
+    registry.record("fp", "db", "exec-1", completed_at=time.time() - 120)
+
+    assert registry.lookup("fp", "db", 300) == ("exec-1", pytest.approx(time.time() - 120, abs=5))
+    assert registry.lookup("fp", "db", 60) is None
+    assert registry.lookup("fp", "otra_db", 300) is None
+
+
+def test_record_replaces_previous_execution(registry):
+    registry.record("fp", "db", "exec-1")
+    registry.record("fp", "db", "exec-2")
+
+    assert registry.lookup("fp", "db", 300)[0] == "exec-2"
+    assert count_rows(registry) == 1
+
+
+def test_record_prunes_entries_older_than_max_age(registry):
+    registry.record("old", "db", "exec-1", completed_at=time.time() - 601)
+    registry.record("new", "db", "exec-2")
+
+    assert count_rows(registry) == 1
+    assert registry.lookup("new", "db", 600) is not None
+
+
+def test_forget_and_clear(registry):
+    registry.record("a", "db", "exec-1")
+    registry.record("b", "db", "exec-2")
+
+    registry.forget("a", "db")
+    assert registry.lookup("a", "db", 600) is None
+
+    registry.clear()
+    assert count_rows(registry) == 0
+
+
+class LockedRegistry:
+    """Registro cuyo archivo SQLite está bloqueado por otro proceso"""
+
+    def lookup(self, fingerprint, database, max_age_seconds):
+        return "exec-1", time.time()
+
+    def forget(self, fingerprint, database):
+        raise sqlite3.OperationalError("database is locked")
+
+
+def test_registry_errors_do_not_fail_the_query(tmp_path, monkeypatch):
+    monkeypatch.setenv("RESULT_REGISTRY_PATH", str(tmp_path / "registry.db"))
+    client = AthenaClient(region_name="us-east-1")
+    client.result_registry = LockedRegistry()
+
+    def expired_result(query_execution_id):
+        raise RuntimeError("el resultado ya no existe en S3")
+
+    monkeypatch.setattr(client, "_get_query_results", expired_result)
+
+    assert client._get_registered_results("fp", "db", time.time(), 600) is None
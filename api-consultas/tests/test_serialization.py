@@ -0,0 +1,141 @@
+"""Tests de FastJSONResponse (ETag / 304) y de la compresión negociada"""
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+import serialization
+from serialization import CompressionMiddleware, FastJSONResponse, _etag_matches, make_etag
+
+ETAG = make_etag("productos_top:10", 1700000000.0)
+ROWS = [{"name": f"producto {i}", "price": i} for i in range(200)]
+
+
+async def rows(request):
+    return FastJSONResponse({"results": ROWS}, etag=ETAG)
+
+
+async def small(request):
+    return FastJSONResponse({"ok": True})
+
+
+async def binary(request):
+    return PlainTextResponse("x" * 4096, media_type="image/svg")
+
+
+def make_client(minimum_size=1024):
+    app = Starlette(routes=[
+        Route("/rows", rows, methods=["GET", "HEAD", "POST"]),
+        Route("/small", small),
+        Route("/binary", binary),
+    ])
+    return TestClient(CompressionMiddleware(app, minimum_size=minimum_size))
+
+
+@pytest.mark.parametrize("if_none_match, matches", [
+    (ETAG, True),
+    (ETAG[2:], True),
+    (f'"otro", {ETAG}', True),
+    ("*", True),
+    ('W/"otro"', False),
+    ("", False),
+])
+def test_etag_matches_uses_weak_comparison(if_none_match, matches):
+    assert _etag_matches(if_none_match, ETAG) is matches
+
+
+def test_etag_changes_when_the_result_is_stored_again():
+    assert make_etag("productos_top:10", 1.0) != make_etag("productos_top:10", 2.0)
+
+
+@pytest.mark.parametrize("method", ["GET", "HEAD"])
+def test_conditional_request_returns_304_without_body(method):
+    response = make_client().request(method, "/rows", headers={"If-None-Match": ETAG})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == ETAG
+
+
+def test_mismatched_etag_returns_full_body():
+    response = make_client().get("/rows", headers={"If-None-Match": 'W/"otro"'})
+
+    assert response.status_code == 200
+    assert response.headers["etag"] == ETAG
+    assert response.json() == {"results": ROWS}
+
+
+def test_post_ignores_if_none_match():
+    response = make_client().post("/rows", headers={"If-None-Match": ETAG})
+
+    assert response.status_code == 200
+    assert response.json() == {"results": ROWS}
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("gzip", "gzip"),
+    ("gzip, zstd", "zstd"),
+    ("zstd;q=0.5, gzip", "gzip"),
+    ("zstd;q=0, gzip;q=0.1", "gzip"),
+    ("gzip;q=0, zstd;q=0", None),
+    ("br, identity", None),
+    ("gzip;q=abc", None),
+    ("", None),
+])
+def test_choose_encoding_by_q_value(accept_encoding, expected):
+    middleware = CompressionMiddleware(app=None)
+
+    assert middleware._choose_encoding(accept_encoding) == expected
+
+
+def test_zstd_is_only_offered_when_installed(monkeypatch):
+    monkeypatch.setattr(serialization, "zstandard", None)
+
+    assert CompressionMiddleware(app=None)._choose_encoding("zstd, gzip;q=0.5") == "gzip"
+    assert CompressionMiddleware(app=None)._choose_encoding("zstd") is None
+
+
+def test_compresses_large_json_bodies():
+    response = make_client().get("/rows", headers={"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "accept-encoding" in response.headers["vary"].lower()
+    assert int(response.headers["content-length"]) < len(serialization.dumps({"results": ROWS}))
+    assert response.json() == {"results": ROWS}
+
+
+@pytest.mark.skipif(serialization.zstandard is None, reason="zstandard no está instalado")
+def test_zstd_body_round_trips():
+    response = make_client().get("/rows", headers={"Accept-Encoding": "zstd"})
+
+    assert response.headers["content-encoding"] == "zstd"
+    body = serialization.zstandard.ZstdDecompressor().decompressobj().decompress(response.content)
+    assert body == serialization.dumps({"results": ROWS})
+
+
+def test_bodies_under_minimum_size_are_not_compressed():
+    client = make_client(minimum_size=1024)
+
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in response.headers
+    assert "vary" not in response.headers
+    assert response.json() == {"ok": True}
+
+
+def test_minimum_size_threshold_is_inclusive():
+    size = len(serialization.dumps({"results": ROWS}))
+
+    assert "content-encoding" in make_client(minimum_size=size).get(
+        "/rows", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in make_client(minimum_size=size + 1).get(
+        "/rows", headers={"Accept-Encoding": "gzip"}).headers
+
+
+def test_non_compressible_content_types_are_left_alone():
+    response = make_client().get("/binary", headers={"Accept-Encoding": "gzip"})
+
+    assert "content-encoding" not in response.headers
+    assert len(response.content) == 4096
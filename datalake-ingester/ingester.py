@@ -7,6 +7,7 @@ import os
 import sys
 import json
 import logging
+import urllib.request
 from datetime import datetime, date
 from decimal import Decimal
 from typing import Dict, List, Any
@@ -247,6 +248,24 @@ class DataIngester:
             logger.error(f"Error al cerrar conexión: {e}")
 
 
+def notify_api_refresh():
+    """
+    Avisa a la API de consultas que hay datos nuevos para que refresque su cache
+
+    Es opcional (API_REFRESH_URL) y un fallo no invalida la ingesta.
+    """
+    refresh_url = os.getenv('API_REFRESH_URL', '').strip()
+    if not refresh_url:
+        return
+
+    try:
+        request = urllib.request.Request(refresh_url, data=b'', method='POST')
+        with urllib.request.urlopen(request, timeout=10) as response:
+            logger.info(f"Refresco de cache solicitado a la API ({response.status})")
+    except Exception as e:
+        logger.warning(f"No se pudo notificar a la API ({refresh_url}): {e}")
+
+
 def main():
     """Función principal"""
     # Leer configuración desde variables de entorno
@@ -277,6 +296,9 @@ def main():
 
         logger.info("Proceso de ingesta completado exitosamente")
 
+        # Refrescar el cache de la API con los datos recién subidos
+        notify_api_refresh()
+
     except Exception as e:
         logger.error(f"Error en el proceso de ingesta: {e}")
         sys.exit(1)